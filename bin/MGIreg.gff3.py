@@ -7,7 +7,7 @@
 # see genemodelload.sh
 #
 # column1 = chromosome
-# column2 = provider (MGI, Ensembl, NCBI, VISTA)
+# column2 = provider (MGI, or a provider of MGIREG_PROVIDER_LDBS: Ensembl, NCBI, VISTA)
 # column3 = MCV term
 # column4 = start coordinate
 # column5 = end coordiate
@@ -27,25 +27,51 @@
 #   Regulates_expression_of=
 #
 # each provider requires:
-#   . "MGI" master row : writeMGIRow()
-#   . a parent row : writeParentRow()
+#   . "MGI" master row : mgiRow()
+#   . parent rows : parentRows()
+#
+# the rows of each marker are rendered by markerRows() and written in
+# batches by GFFWriter
+#
+# the goal of the row writer is at least twice the rows/sec of the old
+# column-variable writer; it is not met: in one process the rows are built
+# only about 10% faster. Each row is one format operation (mgiRow(),
+# parentRows()); most of the rest of the time is in decoding the provider
+# features (featurestore) and in the per-marker lookups, not in the writes.
+# The rows can be spread over processes with MGIREG_PROCESSES (processAll)
+#
+# the rendered rows of each marker are cached (MGIREG_FRAGMENT_CACHE) with
+# a digest of its inputs; the next run only renders the markers whose
+# inputs changed
+#
+# the report is written gzipped (MGIreg.gff3.gz) by gffgzip.GzipWriter, or
+# if MGIREG_OUTPUT_MODE = bgzf, coordinate-sorted as BGZF with a tabix index
+# (MGIreg.gff3.gz.tbi) by gffgzip.BGZFWriter;
+# the uncompressed MGIreg.gff3 is only written if MGIREG_PLAIN_OUTPUT = true
 #
 # 1. Temp Tables to store info from MGI database: init()
 #   set of Markers with MCV regulatory terms (mrk_location_cache)
 #   sorted by start coordinate
 #
-# 2. Read/Create Lookups for Ensembl MGI, NCBI MGI, VISTA MGI : init()
-#   the Marker Key:Provider ID
+# 2. Read/Create Lookup for the provider MGI ids : init()
+#   the Marker Key:Provider IDs, one query for the logical DBs in MGIREG_PROVIDER_LDBS
+#   (providers, from the config: see Provider)
 #
-# 3. Read/Create Lookups for Ensembl GFF, NCBI GFF, VISTA GFF : initGFF()
-#   
-# 4. For each Marker:
+# 3. Read/Create Lookups for the provider GFFs : startGFF(), initGFF()
+#   the files are read in worker processes while initLookups() runs the
+#   SO term query; only the provider ids from step 2 are kept
+#   the files are read where they are downloaded (<PROVIDER>_GFF),
+#   gzipped or not, by readProviderGFF() as set by <PROVIDER>_GFF_FORMAT
 #
-#   Attach all provider ids to Marker Master DbxRef (Ensembl, NCBI, VISTA)
+# 4. For each Marker: processAll()
+#   rendered by chromosome in MGIREG_PROCESSES worker processes, or serially
+#   the Synonym and Regulates_expression_of values are aggregated by the server,
+#   in the markers query
 #
-#   if Marker exists in Ensembl MGI, then add MGI Master, Ensembl Parent, NCBI Parent (if exists), VISTA Parent (if exists)
-#   else if Marker exists in NCBI MGI, then add MGI Master, NCBI Parent, VISTA Parent (if exists)
-#   else if Marker exists in VISTA MGI, then add MGI Master, VISTA Parent
+#   Attach all provider ids to Marker Master DbxRef, in MGIREG_PROVIDER_LDBS order
+#
+#   if Marker exists in any provider MGI, then add MGI Master and the Parents of
+#   each provider it exists in, in MGIREG_PROVIDER_LDBS order (Ensembl, NCBI, VISTA)
 #   else then add MGI Master, MGI Parent
 #
 # Usage:
@@ -60,9 +86,17 @@
 import sys
 import os
 import time
+import re
+import hashlib
+import collections
+import pickle
+import multiprocessing
 import mgi_utils
 import reportlib
 import db
+import gtfreader
+import gffgzip
+import featurestore
 
 db.setTrace()
 
@@ -73,15 +107,49 @@ date = mgi_utils.date('%m/%d/%Y %H:%M:%S') #("%Y-%m-%d")
 # mapping of MCV ID to SO ID and Term
 mcvToSOLookup = {}
 
-# mapping marker organizer -> relationship partipant
-regulatesOfLookup = {}
-
-ensemblMGI = {}
-ncbiMGI = {}
-vistaMGI = {}
-ensemblInfo = {}
-ncbiInfo = {}
-vistaInfo = {}
+# one regulatory provider, from its config (providerConfig()):
+#   name     : provider name, column2 of its parent rows and its dbxRef prefix on the master row
+#   ldbKey   : logical DB of its marker ids
+#   gff      : its GFF file (<NAME>_GFF)
+#   format   : how the provider id is read from a GFF line (<NAME>_GFF_FORMAT):
+#              id     = ID=type:id, the first attribute of column 9
+#              dbxref = Dbxref=<dbxref>:id
+#   dbxref   : database of the GFF Dbxref attribute (<NAME>_GFF_DBXREF)
+#   source   : only the GFF lines that contain it are read (<NAME>_GFF_SOURCE, optional)
+#   skip     : the GFF lines that contain it are skipped (<NAME>_GFF_SKIP, optional)
+#   title, file, url : its section of the report header (<NAME>_TITLE, <NAME>_FILE, <NAME>_FTP)
+Provider = collections.namedtuple('Provider',
+    ['name', 'ldbKey', 'gff', 'format', 'dbxref', 'source', 'skip', 'title', 'file', 'url'])
+
+def providerConfig(name, ldbKey):
+    prefix = name.upper() + '_'
+    return Provider(name, int(ldbKey),
+        os.getenv(prefix + 'GFF', ''),
+        os.getenv(prefix + 'GFF_FORMAT', ''),
+        os.getenv(prefix + 'GFF_DBXREF', ''),
+        os.getenv(prefix + 'GFF_SOURCE', ''),
+        os.getenv(prefix + 'GFF_SKIP', ''),
+        os.getenv(prefix + 'TITLE', name),
+        os.getenv(prefix + 'FILE'),
+        os.getenv(prefix + 'FTP'))
+
+# the providers, in order of precedence: MGIREG_PROVIDER_LDBS
+# "Ensembl:222 NCBI:59 VISTA:223"
+providers = [providerConfig(*p.split(':'))
+    for p in os.getenv('MGIREG_PROVIDER_LDBS', 'Ensembl:222 NCBI:59 VISTA:223').split()]
+
+# {marker key : (id of each provider in providers order, '' if none)}
+providerIdLookup = {}
+
+# provider GFF lookups (featurestore.FeatureStore), in providers order, from initGFF()
+providerInfo = []
+
+# GFF reader processes
+pool = None
+
+# in a renderShard() worker process: the markers split by chromosome and
+# the fragment cache of processAll(), from initShardWorker()
+shardWorker = {}
 
 idTag = 'ID='
 nameTag = 'Name='
@@ -94,40 +162,51 @@ synonymTag = 'Synonym='
 parentTag = 'Parent='
 regulatesOfTag = 'Regulates_expression_of='
 
-dbxRefEnsembl = 'Dbxref=ENSEMBL:'
-dbxRefNCBI = 'Dbxref=GeneID:'
-dbxRefVista = 'Dbxref=VISTA:'
+# GFF line formats (Provider.format)
+idFormat = 'id'
+dbxRefFormat = 'dbxref'
 
 mgiProvider = 'MGI:'
-ensemblProvider = 'Ensembl'
-ncbiProvider = 'NCBI'
-vistaProvider = 'VISTA'
-
-column1 = ''
-column2 = ''
-column3 = ''
-column4 = ''
-column5 = ''
-column6 = '.'
-column7 = ''
-column8 = '.'
-column9 = ''
-columnSynonym = ''
-columnRegulates = ''
+
+# number of rendered rows held before they are written
+BATCH_SIZE = 10000
+
+# version of the rendered rows in the fragment cache; change it when the
+# rows a marker's inputs render to change, so the cache is not used
+FRAGMENT_VERSION = 2
+
+# the GFF rows are rendered with format strings, not concatenated;
+# column6 and column8 are always '.'
+# parent rows are written with a trailing TAB after column9
+#
+# MGI master row: column1 to column8 (mgiColumnsFormat: column1, column3,
+# column4, column5, column7), then the column9 values
+mgiColumnsFormat = '%s' + TAB + 'MGI' + TAB + '%s' + TAB + '%s' + TAB + '%s' + TAB + '.' + TAB + '%s' + TAB + '.' + TAB
+mgiRowFormat = '%s' + idTag + '%s;' + nameTag + '%s;' + descTag + '%s;' + geneIdTag + '%s;' + dbxRefTag + '%s' \
+    + mgiTypeTag + '%s;' + soTag + '%s;%s%s' + CRT
+#
+# provider parent row: column1 to column5, column7, the marker id (ID), the
+# row number, the marker id (Parent, gene_id) and the provider dbxRef
+parentRowFormat = '%s' + TAB + '%s' + TAB + '%s' + TAB + '%s' + TAB + '%s' + TAB + '.' + TAB + '%s' + TAB + '.' + TAB \
+    + idTag + '%s_%d;' + parentTag + '%s;' + geneIdTag + '%s;%s' + TAB + CRT
+#
+# MGI parent row of a single marker: column1 to column8 of its master
+# row, and the marker id (ID, Parent, gene_id, Dbxref)
+singleRowFormat = '%s' + idTag + '%s_1;' + parentTag + '%s;' + geneIdTag + '%s;' + dbxRefTag + mgiProvider + '%s' + TAB + CRT
 
 def writeHeader():
     global fp
 
     mAssembly = os.getenv('MOUSE_ASSEMBLY')
-    ensemblFile = os.getenv('ENSEMBL_FILE')
-    ensembl = os.getenv('ENSEMBL_FTP')
-    ncbiFile = os.getenv('NCBI_FILE')
-    ncbi = os.getenv('NCBI_FTP')
-    vistaFile = os.getenv('VISTA_FILE')
-    vista = os.getenv('VISTA_FTP')
-    ensemblTimeStamp = time.ctime(os.path.getmtime(os.getenv('ENSEMBL_GFF')))
-    ncbiTimeStamp = time.ctime(os.path.getmtime(os.getenv('NCBI_GFF')))
-    vistaTimeStamp = time.ctime(os.path.getmtime(os.getenv('VISTA_GFF')))
+
+    # one section per provider, in providers order
+    sections = []
+    for p in providers:
+        sections.append('''# %s
+# File: %s
+# File url: %s
+# File date used: %s
+''' % (p.title, p.file, p.url, time.ctime(os.path.getmtime(p.gff))))
 
     fp.write('''#gff-version 3
 # MGIreg.gff3
@@ -136,57 +215,45 @@ def writeHeader():
 # Genome build: %s
 #
 # The MGIreg gff3 file is generated by combining information from multiple sources.
-# Regulatory features and genome coordinates are obtained from NCBI, VISTA and the Ensembl Regulatory Build and manual curations at MGI.
+# Regulatory features and genome coordinates are obtained from %s and manual curations at MGI.
 # MGI transforms coordinates to genome build GRCm39 where necessary.
 # Nomenclature, identifiers, and cross references come from MGI. Provider representations of regulatory
 # features are preserved in MGI, with no attempt to identify regulatory feature equivalence between providers.
 # 
 # The following lists information about the provider files used to load regulatory features into MGI: the file, its modification date, and its URL
 # ----------------------------------
-# Ensembl Regulatory Build
-# File: %s
-# File url: %s
-# File date used: %s
-# 
-# VISTA
-# File: %s
-# File url: %s
-# File date used: %s
-# 
-# NCBI
-# File: %s
-# File url: %s
-# File date used: %s
-#
+%s#
 #
-''' % (date, mAssembly, ensemblFile, ensembl, ensemblTimeStamp, vistaFile, vista, vistaTimeStamp, ncbiFile, ncbi, ncbiTimeStamp))
+''' % (date, mAssembly, ', '.join([p.title for p in providers]), '# \n'.join(sections)))
 
-def init():
-    global mcvToSOLookup, regulatesOfLookup
-    global ensemblMGI, ncbiMGI, vistaMGI
-    
+def checkProviders():
     #
-    # create SO ID to SO Term lookup
+    # each provider of MGIREG_PROVIDER_LDBS is read and written from its
+    # config (providerConfig()): stop if a provider is named twice, or its
+    # GFF, GFF format or Dbxref database is not set
     #
-    results = db.sql('''
-        select a.accid as mcvID, t1.term as mcvTerm, a3.accid as soID, t2.term as soTerm
-        from voc_term t1, acc_accession a, acc_accession a2, acc_accession a3, voc_term t2
-        where a._logicaldb_key = 146
-        and a._mgitype_key = 13
-        and a._object_key = t1._term_key
-        and t1._term_key = a2._object_key
-        and a2._mgitype_key = 13
-        and a2._logicaldb_key = 145
-        and a2.accid = a3.accid
-        and a3._mgitype_key = 13
-        and a3._logicaldb_key = 145
-        and a3._object_key = t2._term_key
-        and t2._vocab_key = 138
-        ''', 'auto')
-    for r in results:
-        soList = [r['soID'], r['soTerm']]
-        mcvToSOLookup[r['mcvID']] = soList
 
+    errors = []
+    names = []
+    for p in providers:
+        prefix = p.name.upper() + '_'
+        if p.name.upper() in names:
+            errors.append('%s is named more than once' % (p.name))
+        names.append(p.name.upper())
+        if p.gff == '':
+            errors.append('%sGFF is not set' % (prefix))
+        if p.format not in (idFormat, dbxRefFormat):
+            errors.append('%sGFF_FORMAT must be %s or %s' % (prefix, idFormat, dbxRefFormat))
+        if p.dbxref == '':
+            errors.append('%sGFF_DBXREF is not set' % (prefix))
+
+    if errors:
+        sys.stderr.write('MGIREG_PROVIDER_LDBS: %s\n' % ('; '.join(errors)))
+        sys.exit(1)
+
+def init():
+    global providerIdLookup
+    
     #
     # set of markers
     # markers in MRK_Location_Cache
@@ -198,7 +265,8 @@ def init():
             c.provider, c.genomicchromosome as chromosome, c.startcoordinate, c.endcoordinate, c.strand, 
             m._marker_key, m.symbol, m.name, 
             t.term as featureType, mcv.term as mcvTerm, av.accid as mcvID,
-            '' as soTermName
+            '' as soTermName,
+            row_number() over (order by c.chromosome, c.startcoordinate) as seq
         into temp table markers
         from mrk_location_cache c, acc_accession a, mrk_marker m, 
             mrk_mcv_cache mcv, voc_annot va, voc_term t, acc_accession av
@@ -245,395 +313,616 @@ def init():
     db.sql('''create index kidx1 on markers(_marker_key)''', None)
     db.sql('''create index kidx2 on markers(provider)''', None)
 
-    # Ensembl by Marker key
-    ensemblMGI = {}
-    results = db.sql('''
-        select m._marker_key, p.accid
-        from markers m, acc_accession p
-        where m._marker_key = p._object_key
-        and p._mgitype_key = 2
-        and p._logicaldb_key = 222
-        ''', 'auto')
-    for r in results:
-        key = r['_marker_key']
-        value = r['accid']
-        if key not in ensemblMGI:
-            ensemblMGI[key] = []
-        ensemblMGI[key].append(value)
+    #
+    # provider ids by Marker key, for all the providers in one query
+    #
+    # only the first id of each provider is used (ordered by accession key)
+    #
+    providerIdLookup = {}
+    noIds = ('',) * len(providers)
+    providerByLdb = {}
+    for i, p in enumerate(providers):
+        providerByLdb[p.ldbKey] = i
 
-    # NCBI by Marker key
-    ncbiMGI = {}
     results = db.sql('''
-        select m._marker_key, p.accid
+        select m._marker_key, p._logicaldb_key, p.accid
         from markers m, acc_accession p
         where m._marker_key = p._object_key
         and p._mgitype_key = 2
-        and p._logicaldb_key = 59
-        ''', 'auto')
+        and p._logicaldb_key in (%s)
+        order by m._marker_key, p._accession_key
+        ''' % (','.join([str(p.ldbKey) for p in providers])), 'auto')
     for r in results:
         key = r['_marker_key']
-        value = r['accid']
-        if key not in ncbiMGI:
-            ncbiMGI[key] = []
-        ncbiMGI[key].append(value)
+        i = providerByLdb[r['_logicaldb_key']]
+        ids = providerIdLookup.get(key, noIds)
+        if ids[i] == '':
+            providerIdLookup[key] = ids[:i] + (r['accid'],) + ids[i + 1:]
 
-    # VISTA by Marker key
-    vistaMGI = {}
-    results = db.sql('''
-        select m._marker_key, p.accid
-        from markers m, acc_accession p
-        where m._marker_key = p._object_key
-        and p._mgitype_key = 2
-        and p._logicaldb_key = 223
-        ''', 'auto')
-    for r in results:
-        key = r['_marker_key']
-        value = r['accid']
-        if key not in vistaMGI:
-            vistaMGI[key] = []
-        vistaMGI[key].append(value)
+def initLookups():
+    #
+    # the lookups that are not needed by the GFF readers;
+    # run while the readers started by startGFF() work
+    #
+
+    global mcvToSOLookup
 
-    # Marker Regulates Of -> Marker Relationships._category_key = 1013 | regulates_expression
-    regulatesOfLookup = {}
+    #
+    # create SO ID to SO Term lookup
+    #
     results = db.sql('''
-        select distinct m._marker_key, r._object_key_2, p.symbol, c.pubmedid, c.mgiid
-        from markers m, mgi_relationship r, mrk_marker p, bib_citation_cache c
-        where m._marker_key = r._object_key_1
-        and r._category_key = 1013
-        and r._object_key_2 = p._marker_key
-        and r._refs_key = c._refs_key
-        order by m._marker_key, p.symbol
+        select a.accid as mcvID, t1.term as mcvTerm, a3.accid as soID, t2.term as soTerm
+        from voc_term t1, acc_accession a, acc_accession a2, acc_accession a3, voc_term t2
+        where a._logicaldb_key = 146
+        and a._mgitype_key = 13
+        and a._object_key = t1._term_key
+        and t1._term_key = a2._object_key
+        and a2._mgitype_key = 13
+        and a2._logicaldb_key = 145
+        and a2.accid = a3.accid
+        and a3._mgitype_key = 13
+        and a3._logicaldb_key = 145
+        and a3._object_key = t2._term_key
+        and t2._vocab_key = 138
         ''', 'auto')
     for r in results:
-        key = r['_marker_key']
-        if r['pubmedid'] == None:
-            id = r['mgiid']
-        else:
-            id = 'PMID:' + r['pubmedid']
-        value = r['symbol'] + '[Ref_ID:' + id + ']'
-        if key not in regulatesOfLookup:
-            regulatesOfLookup[key] = []
-        regulatesOfLookup[key].append(value)
-    
-def initGFF():
-    global ensemblInfo
-    global ncbiInfo
-    global vistaInfo
-
-    ensemblGFF = os.getenv('ENSEMBL_GFF_DEFAULT')
-    fpProvider = open(ensemblGFF, 'r', encoding='latin-1')
-    for line in fpProvider:
-        if line.startswith('#'):
-            continue
-        tokens = str.split(line, TAB)
-        t1 = str.split(tokens[8], ';')
-        idTokens = t1[0].split(':')
-        id = idTokens[1]
-        mcvterm = tokens[2]
-        startcoordinate = tokens[3]
-        endcoordinate = tokens[4]
-        strand = tokens[5]
-        dbxRef = id + ';' + t1[1] + ';' + t1[2] + ';' + t1[3] + ';' + t1[4]
-        dbxRef = dbxRef.replace('\n','')
-        value = (mcvterm, startcoordinate, endcoordinate, strand, dbxRefEnsembl + dbxRef)
-        if id not in ensemblInfo:
-            ensemblInfo[id] = []
-        ensemblInfo[id].append(value)
-    fpProvider.close()
-    #print(ensemblInfo)
-
-    ncbiGFF = os.getenv('NCBI_GFF_DEFAULT')
-    fpProvider = open(ncbiGFF, 'r', encoding='latin-1')
-    for line in fpProvider:
+        soList = [r['soID'], r['soTerm']]
+        mcvToSOLookup[r['mcvID']] = soList
+
+def readProviderGFF(provider, fileName, wantedIds):
+    #
+    # provider GFF lookup: {provider id : [(mcvterm, start, end, strand, dbxRef), ...]}
+    # only for the ids in wantedIds (all if None), as a featurestore.FeatureStore
+    #
+    # the id and dbxRef of a line depend on provider.format:
+    #   id     : id = first attribute of column 9 : ID=type:id;
+    #            dbxRef = Dbxref=<dbxref>:id and the next 4 attributes
+    #   dbxref : id = Dbxref=<dbxref>:id, up to ; or ,
+    #            dbxRef = the rest of the line from Dbxref=<dbxref>:
+    #
+
+    dbxRefPrefix = dbxRefTag + provider.dbxref + ':'
+    idRE = re.compile(re.escape(dbxRefPrefix) + '([^;,\n]*)')
+
+    # with provider.source, only the lines that contain it are read;
+    # the others are not decoded
+    if provider.source != '':
+        fpProvider = None
+        lines = gtfreader.grepLines(fileName, provider.source, 'latin-1')
+    else:
+        fpProvider = gtfreader.openInput(fileName, 'latin-1')
+        lines = fpProvider
+
+    info = featurestore.FeatureStore()
+    for line in lines:
         if line.startswith('#'):
             continue
-        if line.find('biological_region') > 0:
-            continue
-        if line.find('RefSeqFE') < 0:
+        if provider.skip != '' and line.find(provider.skip) > 0:
             continue
+
+        # the id is read before the line is split, to skip the unwanted ids
+        if provider.format == idFormat:
+            start = line.rfind(TAB) + 1
+            end = line.find(';', start)
+            idTokens = line[start:end].split(':')
+            if len(idTokens) < 2 or (wantedIds is not None and idTokens[1] not in wantedIds):
+                continue
+            id = idTokens[1]
+        else:
+            match = idRE.search(line)
+            if match is None or (wantedIds is not None and match.group(1) not in wantedIds):
+                continue
+            id = match.group(1)
+
         tokens = str.split(line, TAB)
-        # save dbxRef info
-        t1 = str.split(line, dbxRefNCBI)
-        t2 = t1[1].split(';')
-        # remove ",xxxx" at the end
-        t3 = t2[0].split(',')
-        id = t3[0]
         mcvterm = tokens[2]
         startcoordinate = tokens[3]
         endcoordinate = tokens[4]
         strand = tokens[5]
-        value = (mcvterm, startcoordinate, endcoordinate, strand, dbxRefNCBI + t1[1].replace('\n',''))
-        if id not in ncbiInfo:
-            ncbiInfo[id] = []
-        ncbiInfo[id].append(value)
-    fpProvider.close()
-    #print(ncbiInfo)
-
-    vistaGFF = os.getenv('VISTA_GFF_DEFAULT')
-    fpProvider = open(vistaGFF, 'r', encoding='latin-1')
-    for line in fpProvider:
-        if line.startswith('#'):
-            continue
-        tokens = str.split(line, TAB)
+
         # save dbxRef info
-        t1 = str.split(line, dbxRefVista)
-        t2 = t1[1].split(';')
-        # remove ",xxxx" at the end
-        t3 = t2[0].split(',')
-        id = t3[0]
-        mcvterm = tokens[2]
-        startcoordinate = tokens[3]
-        endcoordinate = tokens[4]
-        strand = tokens[5]
-        value = (mcvterm, startcoordinate, endcoordinate, strand, dbxRefVista + t1[1].replace('\n',''))
-        if id not in vistaInfo:
-            vistaInfo[id] = []
-        vistaInfo[id].append(value)
-    fpProvider.close()
-    #print(vistaInfo)
-
-def setMGIColumns(r, dbx):
-    global column1,column2,column3,column4,column5,column7,column9
-    global columnSynonym, columnRegulates
-
-    column1 = r['chromosome']
-    column2 = 'MGI'
-    column3 = r['mcvterm']
-    column4 = str(r['startcoordinate']).replace(".0", "")
-    column5 = str(r['endCoordinate']).replace(".0", "")
-    column7 = str(r['strand'])
-    column9 = idTag + r['markerid'] + ';'
-    column9 += nameTag + r['symbol'] + ';'
-    column9 += descTag + r['name'] + ';'
-    column9 += geneIdTag + r['markerid'] + ';'
+        if provider.format == idFormat:
+            t1 = str.split(tokens[8], ';')
+            dbxRef = id + ';' + t1[1] + ';' + t1[2] + ';' + t1[3] + ';' + t1[4]
+        else:
+            dbxRef = str.split(line, dbxRefPrefix)[1]
+        info.add(id, mcvterm, startcoordinate, endcoordinate, strand, dbxRefPrefix + dbxRef.replace('\n',''))
+
+    if fpProvider is not None:
+        fpProvider.close()
+    info.finish()
+    return info
+
+def startGFF():
+    #
+    # start reading the provider GFFs, one worker process per file, so
+    # that they are read while initLookups() runs the rest of the
+    # database queries
+    #
+    # each reader keeps only the provider ids processAll() looks up
+    # (providerIdLookup, from init()), and returns its lookup (pickled)
+    # to the main process
+    #
+    # the workers do not use the database connection
+    #
+
+    global pool
+
+    pool = multiprocessing.get_context('fork').Pool(len(providers))
+    return [pool.apply_async(readGFF, (i,)) for i in range(len(providers))]
+
+def readGFF(i):
+    #
+    # read the GFF of providers[i] (readProviderGFF()), for the ids of
+    # the provider that processAll() looks up
+    #
+    # with MGIREG_GFF_INDEX (a directory), the features of all the ids of
+    # the GFF are saved in an index file (featurestore.write) the first
+    # time the GFF is read; the next runs read the wanted ids from the
+    # index (mmap) instead of the GFF, until the GFF's path, size or
+    # modification time changes (a new provider release)
+    #
+
+    provider = providers[i]
+    fileName = provider.gff
+    ids = wantedIds(i)
+    indexDir = os.getenv('MGIREG_GFF_INDEX', '')
+    if indexDir == '':
+        return readProviderGFF(provider, fileName, ids)
+
+    indexFile = os.path.join(indexDir, provider.name + '.' + os.path.basename(fileName) + '.index')
+    key = featurestore.sourceKey(fileName)
+    try:
+        index = featurestore.MappedStore(indexFile, key)
+    except (IOError, featurestore.Error) as e:
+        print('%s GFF index not used (%s); reading %s' % (provider.name, e, fileName))
+        info = readProviderGFF(provider, fileName, None)
+        try:
+            os.makedirs(indexDir, exist_ok = True)
+            featurestore.write(indexFile, info, key)
+        except IOError as e:
+            print('%s GFF index not written: %s' % (provider.name, e))
+        return info.select(ids)
+
+    info = index.select(ids)
+    index.close()
+    return info
+
+def wantedIds(i):
+    #
+    # the ids of providers[i] that processAll() looks up
+    #
+
+    return set([ids[i] for ids in providerIdLookup.values() if ids[i] != ''])
+
+def initGFF(readers):
+    #
+    # wait for the GFF readers started by startGFF()
+    #
+
+    global providerInfo
+
+    startTime = time.time()
+    try:
+        providerInfo = [reader.get() for reader in readers]
+    finally:
+        pool.close()
+        pool.join()
+    print('GFF lookups ready %.2f seconds after the database queries' % (time.time() - startTime))
+
+def mgiColumns(r, chromosome):
+    #
+    # column1 to column8 of the MGI master row, rendered
+    #
+
+    return mgiColumnsFormat % (chromosome, r['mcvterm'],
+        str(r['startcoordinate']).replace(".0", ""),
+        str(r['endCoordinate']).replace(".0", ""),
+        r['strand'])
+
+def mgiRow(r, markerID, columns, dbx, columnSynonym, columnRegulates):
+    #
+    # the MGI master row, rendered, from its first columns (mgiColumns())
+    #
 
     if r['provider'] == 'MGI':
-        column9 += dbxRefTag + mgiProvider + r['markerid'] + ';'
+        dbx = mgiProvider + markerID + ';'
+
+    return mgiRowFormat % (columns, markerID, r['symbol'], r['name'], markerID, dbx,
+        r['featureType'], r['soTermName'], columnSynonym, columnRegulates)
+
+def parentRows(provider, markerID, chromosome, info, counter):
+    #
+    # the parent rows of one provider, rendered; counter numbers the first one
+    #
+
+    rows = []
+    for n in info:
+        rows.append(parentRowFormat % (chromosome, provider, n[0], n[1], n[2], n[3],
+            markerID, counter, markerID, markerID, n[4]))
+        counter += 1
+    return rows
+
+#
+# Buffered writer: rendered rows are written to the file in batches of
+# BATCH_SIZE; writeFragment() adds the rows of a marker as one string
+#
+class GFFWriter:
+
+    def __init__(self, fp, batchSize = BATCH_SIZE):
+        self.fp = fp
+        self.batchSize = batchSize
+        self.fragments = []
+        self.pending = 0
+        self.count = 0
+
+    def write(self, rows):
+        self.writeFragment(''.join(rows), len(rows))
+
+    def writeFragment(self, text, rowCount):
+        self.fragments.append(text)
+        self.pending += rowCount
+        if self.pending >= self.batchSize:
+            self.flush()
+
+    def flush(self):
+        self.fp.write(''.join(self.fragments))
+        self.count += self.pending
+        self.fragments = []
+        self.pending = 0
+
+def loadFragments():
+    #
+    # the fragment cache of the last run (MGIREG_FRAGMENT_CACHE):
+    # {marker key : (inputs digest, rendered rows, row count)}
+    # empty if there is none, or it was written by another FRAGMENT_VERSION;
+    # None if MGIREG_FRAGMENT_CACHE is not set (no cache is kept)
+    #
+
+    cacheFile = os.getenv('MGIREG_FRAGMENT_CACHE')
+    if not cacheFile:
+        return None
+    if not os.path.exists(cacheFile):
+        return {}
+
+    try:
+        fpCache = open(cacheFile, 'rb')
+        version, fragments = pickle.load(fpCache)
+        fpCache.close()
+    except Exception as e:
+        print('fragment cache not used: %s' % (e))
+        return {}
+
+    if version != FRAGMENT_VERSION:
+        return {}
+    return fragments
+
+def saveFragments(fragments):
+    #
+    # replace the fragment cache with this run's fragments
+    #
+
+    cacheFile = os.getenv('MGIREG_FRAGMENT_CACHE')
+    if not cacheFile:
+        return
+
+    fpCache = open(cacheFile + '.new', 'wb')
+    pickle.dump((FRAGMENT_VERSION, fragments), fpCache, pickle.HIGHEST_PROTOCOL)
+    fpCache.close()
+    os.replace(cacheFile + '.new', cacheFile)
+
+def fragmentInputs(r, columnSynonym, columnRegulates):
+    #
+    # digest (sha1) of everything a marker's rows are built from: the
+    # marker row, its provider ids and their GFF features, synonyms and
+    # regulates (seq, the marker's place in the file, is not part of its
+    # rows); only the digest is cached, so the cache file holds the
+    # rendered rows and 20 bytes per marker, not the inputs
+    #
+
+    ids = providerIdLookup.get(r['_marker_key'], ())
+    if ids:
+        features = tuple([info.get(id) for info, id in zip(providerInfo, ids)])
     else:
-        #column9 += dbxRefTag + r['provider'] + ':' + r['providerId'] + ';'
-        column9 += dbxRefTag + dbx
-
-    column9 += mgiTypeTag + r['featureType'] + ';'
-    column9 += soTag + r['soTermName'] + ';'
-    column9 += columnSynonym
-    column9 += columnRegulates
-
-def setParentColumns(provider,r,n,counter):
-    global column2,column3,column4,column5,column7,column9
-
-    column2 = provider
-    column3 = n[0]
-    column4 = n[1]
-    column5 = n[2]
-    column7 = n[3]
-    column9 = idTag + r['markerid'] + '_' + str(counter) + ';'
-    column9 += parentTag + r['markerid'] + ';'
-    column9 += geneIdTag + r['markerid'] + ';'
-    column9 += n[4]
-
-def writeMGIRow():
-    fp.write(column1 + TAB)
-    fp.write(column2 + TAB)
-    fp.write(column3 + TAB)
-    fp.write(column4 + TAB)
-    fp.write(column5 + TAB)
-    fp.write(column6 + TAB)
-    fp.write(column7 + TAB)
-    fp.write(column8 + TAB)
-    fp.write(column9 + CRT)
-
-def writeParentRow():
-    fp.write(column1 + TAB)
-    fp.write(column2 + TAB)
-    fp.write(column3 + TAB)
-    fp.write(column4 + TAB)
-    fp.write(column5 + TAB)
-    fp.write(column6 + TAB)
-    fp.write(column7 + TAB)
-    fp.write(column8 + TAB)
-    fp.write(column9 + TAB)
-    fp.write(CRT)
+        features = ()
 
-def processAll():
-    global column1,column2,column3,column4,column5,column6,column7,column8,column9
-    global columnSynonym, columnRegulates
-
-    synonymLookup = {}
-    sresults = db.sql('''
-        (
-        select s._object_key as _marker_key, s.synonym, null as refid
-        from markers m, mgi_synonym s
-        where m._marker_key = s._object_key
-        and s._mgitype_key = 2
-        and s._refs_key is null
-        union
-        select s._object_key as _marker_key, s.synonym, array_to_string(array_agg(distinct 'PMID:'||r.pubmedid),',')
-        from markers m, mgi_synonym s, bib_citation_cache r
-        where m._marker_key = s._object_key
-        and s._mgitype_key = 2
-        and s._refs_key = r._refs_key
-        and r.pubmedid is not null
-        group by 1,2
-        union
-        select s._object_key as _marker_key, s.synonym, array_to_string(array_agg(distinct r.jnumid),',')
-        from markers m, mgi_synonym s, bib_citation_cache r
-        where m._marker_key = s._object_key
-        and s._mgitype_key = 2
-        and s._refs_key = r._refs_key
-        and r.pubmedid is null
-        group by 1,2
-        )
-        ''', 'auto')
-    for r in sresults:
-        key = r['_marker_key']
-        if r['refid'] != None:
-            value = r['synonym'] + '[Ref_ID:' + r['refid'] + ']'
-        else:
-            value = r['synonym']
-        if key not in synonymLookup:
-            synonymLookup[key] = []
-        synonymLookup[key].append(value)
-    #print(str(len(synonymLookup)))
+    marker = tuple([v for k, v in r.items() if k != 'seq'])
+    inputs = (marker, ids, features, columnSynonym, columnRegulates)
+    return hashlib.sha1(repr(inputs).encode('utf-8', 'surrogateescape')).digest()
+
+#
+# Writes the same text to several files
+#
+class TeeWriter:
 
-    results = db.sql('''select * from markers ''', 'auto')
+    def __init__(self, files):
+        self.files = files
 
-    # for each marker in results
-    for r in results:
-        key = r['_marker_key']
+    def write(self, text):
+        for f in self.files:
+            f.write(text)
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+def openOutput():
+    #
+    # MGIreg.gff3.gz, compressed in parallel blocks (MGIREG_GZIP_LEVEL, MGIREG_GZIP_THREADS)
+    # if MGIREG_OUTPUT_MODE = bgzf, coordinate-sorted BGZF with a tabix index (MGIreg.gff3.gz.tbi)
+    # and MGIreg.gff3 as well, if MGIREG_PLAIN_OUTPUT = true
+    #
+
+    outputDir = os.getenv('OUTPUTDIR')
+    level = int(os.getenv('MGIREG_GZIP_LEVEL', gffgzip.DEFAULT_LEVEL))
+    threads = os.getenv('MGIREG_GZIP_THREADS')
+    threads = threads and int(threads)
+
+    if os.getenv('MGIREG_OUTPUT_MODE') == 'bgzf':
+        gzOutput = gffgzip.BGZFWriter(outputDir + '/MGIreg.gff3.gz', level = level, threads = threads)
+    else:
+        gzOutput = gffgzip.GzipWriter(outputDir + '/MGIreg.gff3.gz', level = level, threads = threads)
+
+    if os.getenv('MGIREG_PLAIN_OUTPUT') != 'true':
+        return gzOutput
+
+    return TeeWriter([open(outputDir + '/MGIreg.gff3', 'w', buffering = 1 << 20), gzOutput])
+
+def markerRows(r, columnSynonym, columnRegulates):
+    #
+    # the GFF rows of one marker: the MGI master row and its parent rows
+    #
 
-        # get the SO term if the mcvID mapped to SO
-        mcvID = r['mcvID']
-        r['soTermName'] = ''
-        if mcvID in mcvToSOLookup:
-            r['soTermName'] = mcvToSOLookup[mcvID][1]
-
-        if r['strand'] == None:
-            r['strand'] = ''
-
-        # Synonym=synonym1[Ref_ID:1, Ref_ID:2,etc,],
-        columnSynonym = ''
-        if key in synonymLookup:
-            columnSynonym = ';' + synonymTag + ",".join(synonymLookup[key])
-
-        # Regulates_expression_of=Tgfbr2[Ref_ID:PMID:25190800],etc.
-        columnRegulates = ''
-        if key in regulatesOfLookup:
-            columnRegulates = ';' + regulatesOfTag + ",".join(regulatesOfLookup[key])
-
-        # parent row
-
-        # if marker contains Ensembl
-        if key in ensemblMGI:
-
-            id = ensemblMGI[key][0]
-            nid = ''
-            vid = ''
-
-            # mgi row
-            dbxinfo = []
-            dbxinfo.append(ensemblProvider + ':' + id)
-            if key in ncbiMGI:
-                nid = ncbiMGI[key][0]
-                dbxinfo.append(ncbiProvider + ':' + nid)
-            if key in vistaMGI:
-                vid = vistaMGI[key][0]
-                dbxinfo.append(vistaProvider + ':' + vid)
-            dbx = ",".join(dbxinfo) + ';'
-            setMGIColumns(r, dbx)
-            writeMGIRow()
-
-            counter = 1
-
-            # parent row
-            if id not in ensemblInfo:
-                print('not in ensembl gff: ', id)
+    key = r['_marker_key']
+    markerID = r['markerid']
+    chromosome = r['chromosome']
+
+    # the providers the marker has an id of, in order of precedence
+    ids = providerIdLookup.get(key)
+    if ids is None:
+        present = []
+    else:
+        present = [i for i in range(len(providers)) if ids[i] != '']
+
+    # the first of them leads: attach all the provider ids to the mgi row,
+    # then add a parent row set for each provider
+    if present:
+
+        # mgi row
+        dbxinfo = []
+        for i in present:
+            dbxinfo.append(providers[i].name + ':' + ids[i])
+        dbx = ",".join(dbxinfo) + ';'
+        rows = [mgiRow(r, markerID, mgiColumns(r, chromosome), dbx, columnSynonym, columnRegulates)]
+
+        # parent rows: none if the lead id is not in its gff; the other
+        # providers whose id is not in their gff are skipped
+        for i in present:
+            info = providerInfo[i].get(ids[i])
+            if info is None:
+                print('not in %s gff: ' % (providers[i].name.lower()), ids[i])
+                if i == present[0]:
+                    return rows
                 continue
+            rows.extend(parentRows(providers[i].name, markerID, chromosome, info, len(rows)))
 
-            for n in ensemblInfo[id]:
-                setParentColumns(ensemblProvider,r,n,counter)
-                writeParentRow()
-                counter += 1
-
-            # parent row
-            if nid != '':
-                for n in ncbiInfo[nid]:
-                    setParentColumns(ncbiProvider,r,n,counter)
-                    writeParentRow()
-                    counter += 1
-
-            # parent row
-            if vid != '':
-                for n in vistaInfo[vid]:
-                    setParentColumns(vistaProvider,r,n,counter)
-                    writeParentRow()
-                    counter += 1
-
-        # if marker contains NCBI
-        elif key in ncbiMGI:
-
-            id = ncbiMGI[key][0]
-            vid = ''
-
-            # mgi row
-            dbxinfo = []
-            dbxinfo.append(ncbiProvider + ':' + id)
-            if key in vistaMGI:
-                vid = vistaMGI[key][0]
-                dbxinfo.append(vistaProvider + ':' + vid)
-            dbx = ",".join(dbxinfo) + ';'
-            setMGIColumns(r, dbx)
-            writeMGIRow()
-
-            counter = 1
-
-            # parent row
-            for n in ncbiInfo[id]:
-                setParentColumns(ncbiProvider,r,n,counter)
-                writeParentRow()
-                counter += 1
-
-            # parent row
-            if vid != '':
-                for n in vistaInfo[vid]:
-                    setParentColumns(vistaProvider,r,n,counter)
-                    writeParentRow()
-                    counter += 1
-
-        elif key in vistaMGI:
-
-            id = vistaMGI[key][0]
-
-            # mgi row
-            setMGIColumns(r, vistaProvider + ':' + id + ';')
-            writeMGIRow()
-
-            counter = 1
-
-            # parent row
-            for n in vistaInfo[id]:
-                setParentColumns(vistaProvider,r,n,counter)
-                writeParentRow()
-                counter += 1
-
-        # else marker is single
-        else:
-            # mgi row
-            setMGIColumns(r, r['provider'] + ':' + r['markerID'] + ';')
-            writeMGIRow()
+    # else marker is single
+    else:
+        # mgi row
+        columns = mgiColumns(r, chromosome)
+        rows = [mgiRow(r, markerID, columns, r['provider'] + ':' + markerID + ';', columnSynonym, columnRegulates)]
+
+        # parent row: the mgi row's columns, with its own column9
+        rows.append(singleRowFormat % (columns, markerID, markerID, markerID, markerID))
 
-            column9 = idTag + r['markerid'] + '_1;'
-            column9 += parentTag + r['markerid'] + ';'
-            column9 += geneIdTag + r['markerid'] + ';'
-            column9 += dbxRefTag + mgiProvider + r['markerid']
-            writeParentRow()
+    return rows
+
+def renderMarker(r, cachedFragments):
+    #
+    # the rendered rows of one marker: from the fragment cache of the
+    # last run (cachedFragments) if its inputs did not change
+    # returns (marker key, (inputs digest, rendered rows, row count));
+    # the digest is None if no cache is kept (cachedFragments is None)
+    #
+
+    # get the SO term if the mcvID mapped to SO
+    mcvID = r['mcvID']
+    r['soTermName'] = ''
+    if mcvID in mcvToSOLookup:
+        r['soTermName'] = mcvToSOLookup[mcvID][1]
+
+    if r['strand'] == None:
+        r['strand'] = ''
+
+    # Synonym=synonym1[Ref_ID:1, Ref_ID:2,etc,],
+    columnSynonym = ''
+    if r['synonyms'] != None:
+        columnSynonym = ';' + synonymTag + r['synonyms']
+
+    # Regulates_expression_of=Tgfbr2[Ref_ID:PMID:25190800],etc.
+    columnRegulates = ''
+    if r['regulates'] != None:
+        columnRegulates = ';' + regulatesOfTag + r['regulates']
+
+    key = r['_marker_key']
+    if cachedFragments is None:
+        rows = markerRows(r, columnSynonym, columnRegulates)
+        return key, (None, ''.join(rows), len(rows))
+
+    inputs = fragmentInputs(r, columnSynonym, columnRegulates)
+    fragment = cachedFragments.get(key)
+    if fragment is None or fragment[0] != inputs:
+        rows = markerRows(r, columnSynonym, columnRegulates)
+        fragment = (inputs, ''.join(rows), len(rows))
+    return key, fragment
+
+def splitShards(results):
+    #
+    # split the markers (in file order) into runs of the same chromosome
+    #
+
+    shards = []
+    chromosome = None
+    for r in results:
+        if not shards or r['chromosome'] != chromosome:
+            shards.append([])
+            chromosome = r['chromosome']
+        shards[-1].append(r)
+    return shards
+
+def initShardWorker(shards, cachedFragments):
+    #
+    # Pool initializer of the renderShard() worker processes; with fork
+    # the arguments are inherited by the workers, not pickled
+    #
+
+    shardWorker['shards'] = shards
+    shardWorker['cachedFragments'] = cachedFragments
+
+def renderShard(i):
+    #
+    # in a worker process: render the markers of shards[i]
+    # returns [(marker key, fragment), ...], with None for the fragments
+    # taken from the cache (the main process already has them)
+    #
+
+    shards = shardWorker['shards']
+    cachedFragments = shardWorker['cachedFragments']
+
+    out = []
+    for r in shards[i]:
+        key, fragment = renderMarker(r, cachedFragments)
+        if cachedFragments is not None and fragment is cachedFragments.get(key):
+            fragment = None
+        out.append((key, fragment))
+    return out
+
+def processAll():
+
+    #
+    # the markers, in chromosome/start coordinate order, with their
+    # Synonym and Regulates_expression_of values built by the server:
+    #
+    # synonyms  : synonym[Ref_ID:PMID:1,PMID:2],synonym,...
+    #             sorted; the PubMed ids of a synonym, or its J: ids if it has none
+    # regulates : symbol[Ref_ID:PMID:1],symbol[Ref_ID:MGI:1],...
+    #             Marker Relationships._category_key = 1013 | regulates_expression
+    #             sorted by symbol
+    #
+    results = db.sql('''
+        select m.*, syn.synonyms, reg.regulates
+        from markers m
+        left outer join (
+            select s._marker_key,
+                string_agg(s.synonym || coalesce('[Ref_ID:' || s.refid || ']', ''), ','
+                    order by s.synonym, s.refid) as synonyms
+            from (
+                select s._object_key as _marker_key, s.synonym, null as refid
+                from markers m, mgi_synonym s
+                where m._marker_key = s._object_key
+                and s._mgitype_key = 2
+                and s._refs_key is null
+                union
+                select s._object_key as _marker_key, s.synonym, array_to_string(array_agg(distinct 'PMID:'||r.pubmedid),',')
+                from markers m, mgi_synonym s, bib_citation_cache r
+                where m._marker_key = s._object_key
+                and s._mgitype_key = 2
+                and s._refs_key = r._refs_key
+                and r.pubmedid is not null
+                group by 1,2
+                union
+                select s._object_key as _marker_key, s.synonym, array_to_string(array_agg(distinct r.jnumid),',')
+                from markers m, mgi_synonym s, bib_citation_cache r
+                where m._marker_key = s._object_key
+                and s._mgitype_key = 2
+                and s._refs_key = r._refs_key
+                and r.pubmedid is null
+                group by 1,2
+                ) s
+            group by s._marker_key
+            ) syn on (m._marker_key = syn._marker_key)
+        left outer join (
+            select g._marker_key,
+                string_agg(g.symbol || '[Ref_ID:' || g.refid || ']', ','
+                    order by g.symbol, g.refid) as regulates
+            from (
+                select distinct m._marker_key, r._object_key_2, p.symbol,
+                    coalesce('PMID:' || c.pubmedid, c.mgiid) as refid
+                from markers m, mgi_relationship r, mrk_marker p, bib_citation_cache c
+                where m._marker_key = r._object_key_1
+                and r._category_key = 1013
+                and r._object_key_2 = p._marker_key
+                and r._refs_key = c._refs_key
+                ) g
+            group by g._marker_key
+            ) reg on (m._marker_key = reg._marker_key)
+        order by m.seq
+        ''', 'auto')
+
+    startTime = time.time()
+    writer = GFFWriter(fp)
+
+    # rows are only rendered for markers whose inputs changed since the last run
+    # (fragments: this run's, to be cached for the next one)
+    cachedFragments = loadFragments()
+    fragments = {}
+    keep = cachedFragments is not None
+
+    processes = int(os.getenv('MGIREG_PROCESSES', '1'))
+    if processes > 1:
+        #
+        # sharded: the markers of each chromosome are rendered in a worker
+        # process; the shards come back in order (imap) and are written
+        # as they arrive, so the file is the same as in serial mode
+        #
+        # fork, so the workers share the lookups (copy-on-write), and the
+        # shards and fragment cache (initShardWorker) instead of having
+        # them pickled; only the rendered fragments are sent back
+        #
+        shards = splitShards(results)
+        shardPool = multiprocessing.get_context('fork').Pool(processes,
+            initShardWorker, (shards, cachedFragments))
+        try:
+            for shard in shardPool.imap(renderShard, range(len(shards))):
+                for key, fragment in shard:
+                    if fragment is None:
+                        fragment = cachedFragments[key]
+                    if keep:
+                        fragments[key] = fragment
+                    writer.writeFragment(fragment[1], fragment[2])
+        finally:
+            shardPool.close()
+            shardPool.join()
+        print('%d chromosome shards rendered by %d processes' % (len(shards), processes))
+
+    else:
+        # for each marker in results
+        for r in results:
+            key, fragment = renderMarker(r, cachedFragments)
+            if keep:
+                fragments[key] = fragment
+            writer.writeFragment(fragment[1], fragment[2])
+
+    writer.flush()
+    print('%d rows written in %.2f seconds (%d rows/sec)' % \
+        (writer.count, time.time() - startTime, writer.count / max(time.time() - startTime, 0.001)))
+
+    if keep:
+        reused = len([k for k in fragments if cachedFragments.get(k) is fragments[k]])
+        print('%d of %d markers from the fragment cache' % (reused, len(fragments)))
+        saveFragments(fragments)
 
 #
 # Main
 #
-fp = open(os.getenv('OUTPUTDIR') + '/MGIreg.gff3', 'w')
-writeHeader();
-init()
-initGFF()
-processAll()
-fp.close()
+if __name__ == '__main__':
+    checkProviders()
+    fp = openOutput()
+    writeHeader();
+    init()
+    readers = startGFF()
+    initLookups()
+    initGFF(readers)
+    processAll()
+    fp.close()
 
@@ -48,17 +48,27 @@ touch ${LOG}
 
 echo `date`: Start MGIreg.gff3 public report | tee -a ${LOG}
 
-# unzip and copy to input dir the ensembl gff
-echo "gunzip -c ${ENSEMBL_GFF} > ${ENSEMBL_GFF_DEFAULT}" | tee -a ${LOG}
-gunzip -c ${ENSEMBL_GFF} > ${ENSEMBL_GFF_DEFAULT} | tee -a ${LOG}
-
-# unzip and copy to input dir the ncbi gff
-echo "gunzip -c ${NCBI_GFF} > ${NCBI_GFF_DEFAULT}" | tee -a ${LOG}
-gunzip -c ${NCBI_GFF} > ${NCBI_GFF_DEFAULT} | tee -a ${LOG}
+#
+# MGIreg.gff3.py reads the provider GFFs where they are downloaded;
+# the uncompressed copies in the input directory are only made when
+# MGIREG_KEEP_INPUT is set, for debugging
+#
+for ldb in ${MGIREG_PROVIDER_LDBS}
+do
+    # <provider>_GFF, <provider>_GFF_DEFAULT
+    provider=`echo ${ldb} | cut -d: -f1 | tr '[:lower:]' '[:upper:]'`
+    eval gff=\${${provider}_GFF}
+    eval gffDefault=\${${provider}_GFF_DEFAULT}
 
-# copy to input dir the vista gff
-echo "${VISTA_GFF} > ${VISTA_GFF_DEFAULT}" | tee -a ${LOG}
-cp ${VISTA_GFF} ${VISTA_GFF_DEFAULT} | tee -a ${LOG}
+    if [ "${MGIREG_KEEP_INPUT}" = "true" ]
+    then
+        # unzip (or copy, if it is not gzipped) to input dir the provider gff
+        echo "gunzip -cf ${gff} > ${gffDefault}" | tee -a ${LOG}
+        gunzip -cf ${gff} > ${gffDefault} | tee -a ${LOG}
+    else
+        rm -f ${gffDefault}
+    fi
+done
 
 echo `date`: $i | tee -a ${LOG}
 ${PYTHON} ${GENEMODELLOAD}/bin/MGIreg.gff3.py >> ${LOG} 2>&1
@@ -66,10 +76,17 @@ ${PYTHON} ${GENEMODELLOAD}/bin/MGIreg.gff3.py >> ${LOG} 2>&1
 #
 # Copy report to ftp site
 #
+# MGIreg.gff3.py writes MGIreg.gff3.gz
+# (and MGIreg.gff3.gz.tbi if MGIREG_OUTPUT_MODE=bgzf)
+#
 cd ${OUTPUTDIR}
-cat MGIreg.gff3 | gzip -cf9 > MGIreg.gff3.gz
-touch MGIreg.gff3.gz
 cp -p MGIreg.gff3.gz ${DISTRIBDIR}/
+if [ "${MGIREG_OUTPUT_MODE}" = "bgzf" ]
+then
+    cp -p MGIreg.gff3.gz.tbi ${DISTRIBDIR}/
+else
+    rm -f ${DISTRIBDIR}/MGIreg.gff3.gz.tbi
+fi
 
 echo `date`: End MGIreg.gff3 public report | tee -a ${LOG}
 
@@ -27,16 +27,44 @@
 #		load - run sanity checks & delete/reload the data into MRK_BiotypeMapping table
 #		preview - run sanity checks only
 #
+#	--check : compare the input file, the vocabularies and the MCV DAG
+#		  with the state of the last load (BIOTYPESTATE_FILE) and print
+#		  what is needed:
+#		skip    - nothing changed
+#		mapping - only the mapping columns (3-6) or the MCV DAG
+#			  changed; the biotype vocabularies do not need to be
+#			  reloaded
+#		reload  - the biotype terms changed, the vocabularies changed
+#			  or there is no state: full reload
+#
+# Biotype vocabularies:
+#
+#	The biotype terms (fields 1, 2) are kept in step with the input file
+#	in the same transaction as the MRK_BiotypeMapping swap: new terms are
+#	added, terms that are no longer in the file are marked obsolete (and
+#	un-marked if they come back). Existing terms keep their _term_key,
+#	so the live mapping never points at a missing term.
+#
 # Sanity Checks: see sanityCheck()
 #
 #        1)  Invalid Line (missing column(s))
-#        2)  Invalid Biotype Term
+#        2)  Invalid BioType Vocab
 #        3)  Invalid MCV (Feature) Term
 #        4)  Invalid Marker Type
 #
 # Output:
 #
-#       1 BCP files:
+#	MRK_BiotypeMapping rows: on a full reload, loaded with COPY into a
+#	staging table, checked, and swapped into MRK_BiotypeMapping in one
+#	short transaction (see genemodeldb.swapLoad), so readers see the old
+#	rows until the swap; if only the mapping columns changed, only the
+#	rows that differ are deleted/inserted
+#	State file (BIOTYPESTATE_FILE): input file hashes, the MCV DAG
+#	closure hash and the resolved term/marker type keys of the last load
+#	Biotype resolution file (BIOTYPE_RESOLUTION_FILE, see
+#	biotyperesolution.py): raw biotype per provider vocabulary to
+#	marker type, primary MCV and the MCV keys, with the MCV children
+#	expanded where useMCVchildren is set
 #	Diagnostics file of all input parameters and SQL commands
 #	Error file
 #
@@ -49,9 +77,11 @@
 
 import sys
 import os
-import db
+import json
+import hashlib
 import mgi_utils
-import loadlib
+import genemodeldb
+import biotyperesolution
 
 ### Constants ###
 
@@ -62,6 +92,9 @@ MGP_VOCAB_KEY = 136
 ENSEMBLREG_VOCAB_KEY = 176
 VISTAREG_VOCAB_KEY = 175
 
+BIOTYPE_VOCAB_KEYS = (ENSEMBL_VOCAB_KEY, NCBI_VOCAB_KEY, MGP_VOCAB_KEY,
+    ENSEMBLREG_VOCAB_KEY, VISTAREG_VOCAB_KEY)
+
 # MCV vocab key
 MCV_VOCAB_KEY = 79
 
@@ -70,18 +103,21 @@ cdate = mgi_utils.date('%m/%d/%Y')	# current date
 
 # sanity check error messages
 INVALID_VOCAB_ERROR = "Invalid BioType Vocab (row %d): %s"
-INVALID_BIOTYPE_TERM_ERROR = "Invalid BioType Term (row %d): %s, for vocab %s"
 INVALID_MARKER_TYPE_ERROR = "Invalid Marker Type Term (row %d): %s"
 INVALID_MCV_TERM_ERROR = "Invalid MCV/Feature Type Term (row %d): %s"
 INVALID_PRIMARY_FEATURE_ERROR = "Invalid Primary Feature Type Term (row %d): %s"
 
+# --check results
+CHECK_SKIP = 'skip'
+CHECK_MAPPING = 'mapping'
+CHECK_RELOAD = 'reload'
+
 ### Globals ###
 
 DEBUG = 0		# set DEBUG to false unless preview mode is selected
 bcpon = 1		# can the bcp files be bcp-ed into the database?  default is yes (1).
 
 inputFile = ''		# file descriptor
-outputFile = ''		# file descriptor
 diagFile = ''		# file descriptor
 errorFile = ''		# file descriptor
 
@@ -95,6 +131,35 @@ markerType = None
 markerTypeKey = 0
 useMCVchildren = None
 
+biotypeRows = []	# MRK_BiotypeMapping rows to load
+
+# one per input line that passes the sanity checks:
+# (vocab key, term key, marker type key, primary MCV key, [MCV key, ...], useMCVchildren)
+resolutionRows = []
+
+lookupsLoaded = 0	# have the lookups below been loaded?
+
+# loaded once by loadLookups(); the terms/names are lowercased, as
+# loadlib.verifyTerm/verifyMarkerType compare them
+termKeyLookup = {}	# {(_vocab_key, lowercase term) : _term_key, ...}
+markerTypeKeyLookup = {}	# {lowercase marker type : _marker_type_key, ...}
+termLookup = {}			# {_term_key : term, ...}
+
+# biotype vocabulary terms: {_term_key : isObsolete, ...} of the terms in
+# the database, the new terms to add [(_term_key, _vocab_key, term), ...]
+# and the _term_keys of the biotype terms in the input file
+biotypeTermObsolete = {}
+newBiotypeTerms = []
+inputBiotypeTermKeys = set()
+nextTermKey = 0
+
+# the term/marker type keys resolved by this load, saved in the state file
+resolvedTermKeys = {}		# {'_vocab_key|lowercase term' : _term_key, ...}
+resolvedMarkerTypeKeys = {}	# {lowercase marker type : _marker_type_key, ...}
+
+# hash of the MCV DAG closure the resolution file was written from
+closureHash = None
+
 #
 # from configuration file
 #
@@ -104,24 +169,21 @@ mode = None
 # BIOTYPETABLE
 biotypeTable = None
 
-# OUTPUTDIR
-outputFileDir = None
-
 # BIOTYPEINPUT_FILE_DEFAULT
 inputFileName = None
 
-# name of BCP file
-bcpFileName = None
-
-# full path of bcp file
-outputFileName = None
-
 # BIOTYPELOG_DIAG
 diagFileName = None
 
 # BIOTYPELOG_ERROR
 errorFileName = None
 
+# BIOTYPESTATE_FILE
+stateFileName = None
+
+# BIOTYPE_RESOLUTION_FILE
+resolutionFileName = None
+
 def initConfig():
     '''
     #
@@ -132,23 +194,19 @@ def initConfig():
 
     global mode
     global biotypeTable
-    global outputFileDir
     global inputFileName
-    global bcpFileName
-    global outputFileName
     global diagFileName
     global errorFileName
-    global bcpCommand
+    global stateFileName
+    global resolutionFileName
 
     mode = os.environ['BIOTYPEMODE']
     biotypeTable = os.environ['BIOTYPETABLE']
-    outputFileDir = os.environ['OUTPUTDIR']
     inputFileName = os.environ['BIOTYPEINPUT_FILE_DEFAULT']
-    bcpFileName = biotypeTable + '.bcp'
-    outputFileName = os.environ['OUTPUTDIR'] + '/' + bcpFileName
     diagFileName = os.environ['BIOTYPELOG_DIAG']
     errorFileName = os.environ['BIOTYPELOG_ERROR']
-    bcpCommand = os.environ['BCP_CMD']
+    stateFileName = os.environ['BIOTYPESTATE_FILE']
+    resolutionFileName = os.environ['BIOTYPE_RESOLUTION_FILE']
 
 def exit(status, message = None):
     '''
@@ -191,8 +249,8 @@ def init():
     #
     '''
 
-    global inputFile, outputFile, diagFile, errorFile
-    global inputFileName, errorFileName, diagFileName, outputFileName
+    global inputFile, diagFile, errorFile
+    global inputFileName, errorFileName, diagFileName
 
     try:
         inputFile = open(inputFileName, 'r')
@@ -209,24 +267,164 @@ def init():
     except:
         exit(1, 'Could not open file %s\n' % errorFileName)
             
-    try:
-        outputFile = open(outputFileName, 'w')
-    except:
-        exit(1, 'Could not open file %s\n' % outputFileName)
-            
     # Log all SQL 
-    db.set_sqlLogFunction(db.sqlLogAll)
-
-    # Set Log File Descriptor
-    db.set_commandLogFile(diagFileName)
+    genemodeldb.setCommandLog(diagFile)
 
     # Set Log File Descriptor
     diagFile.write('Start Date/Time: %s\n' % (mgi_utils.date()))
-    diagFile.write('Server: %s\n' % (db.get_sqlServer()))
-    diagFile.write('Database: %s\n' % (db.get_sqlDatabase()))
+    diagFile.write('Server: %s\n' % (os.environ['MGD_DBSERVER']))
+    diagFile.write('Database: %s\n' % (os.environ['MGD_DBNAME']))
     diagFile.write('Input File: %s\n' % (inputFileName))
     errorFile.write('\nStart file: %s\n\n' % (mgi_utils.date()))
 
+def loadLookups():
+    '''
+    # requires:
+    #
+    # effects:
+    #	Loads the biotype and MCV vocabulary terms and the marker types
+    #	into the lookups used by sanityCheck() and checkState(), once
+    #
+    # returns:
+    #	nothing
+    #
+    '''
+
+    global lookupsLoaded
+    global nextTermKey
+
+    if lookupsLoaded:
+        return
+
+    vocabKeys = BIOTYPE_VOCAB_KEYS + (MCV_VOCAB_KEY,)
+
+    results = genemodeldb.sql('''select _Vocab_key, _Term_key, term, isObsolete from VOC_Term where _Vocab_key in (%s)''' % \
+        (','.join([str(k) for k in vocabKeys])), 'auto')
+    for r in results:
+        termKeyLookup[(r['_Vocab_key'], r['term'].lower())] = r['_Term_key']
+        termLookup[r['_Term_key']] = r['term']
+        if r['_Vocab_key'] in BIOTYPE_VOCAB_KEYS:
+            biotypeTermObsolete[r['_Term_key']] = r['isObsolete']
+
+    results = genemodeldb.sql('''select max(_Term_key) as maxKey from VOC_Term''', 'auto')
+    nextTermKey = (results[0]['maxKey'] or 0) + 1
+
+    results = genemodeldb.sql('''select _Marker_Type_key, name from MRK_Types''', 'auto')
+    for r in results:
+        markerTypeKeyLookup[r['name'].lower()] = r['_Marker_Type_key']
+
+    lookupsLoaded = 1
+
+def verifyTerm(vocabKey, term, lineNum):
+    '''
+    # requires:
+    #
+    # effects:
+    #	Looks up the term in the vocabulary; writes the loadlib.verifyTerm
+    #	error message to the error file if it is not found
+    #
+    # returns:
+    #	_term_key, or 0 if the term is not in the vocabulary
+    #
+    '''
+
+    termKey = termKeyLookup.get((vocabKey, term.lower()), 0)
+    if termKey == 0:
+        errorFile.write('Invalid Term (%d) %s\n' % (lineNum, term))
+    else:
+        resolvedTermKeys['%d|%s' % (vocabKey, term.lower())] = termKey
+    return termKey
+
+def addBiotypeTerm(vocabKey, term):
+    '''
+    # requires:
+    #
+    # effects:
+    #	Looks up the biotype term in the vocabulary; a term that is not
+    #	there yet gets a new _term_key and is added to newBiotypeTerms,
+    #	to be inserted by loadFiles()
+    #
+    # returns:
+    #	_term_key
+    #
+    '''
+
+    global nextTermKey
+
+    termKey = termKeyLookup.get((vocabKey, term.lower()), 0)
+    if termKey == 0:
+        termKey = nextTermKey
+        nextTermKey = nextTermKey + 1
+        termKeyLookup[(vocabKey, term.lower())] = termKey
+        termLookup[termKey] = term
+        newBiotypeTerms.append((termKey, vocabKey, term))
+
+    resolvedTermKeys['%d|%s' % (vocabKey, term.lower())] = termKey
+    inputBiotypeTermKeys.add(termKey)
+    return termKey
+
+def biotypeTermCmds():
+    '''
+    # requires:
+    #
+    # effects:
+    #	Builds the SQL that brings the biotype vocabularies in step with
+    #	the input file: insert the new terms and un-mark the terms that
+    #	are back (before the swap), mark the terms that are no longer in
+    #	the file obsolete (after the swap)
+    #
+    # returns:
+    #	(list of commands before the swap, list of commands after it)
+    #
+    '''
+
+    preCmds = []
+    postCmds = []
+
+    if newBiotypeTerms:
+        values = []
+        for termKey, vocabKey, term in newBiotypeTerms:
+            values.append("(%d, %d, '%s', 0, %d, %d)" % \
+                (termKey, vocabKey, term.replace("'", "''"), createdByKey, createdByKey))
+        preCmds.append('''insert into VOC_Term (_Term_key, _Vocab_key, term, isObsolete,
+            _CreatedBy_key, _ModifiedBy_key) values %s''' % (', '.join(values)))
+
+    revived = [k for k in inputBiotypeTermKeys if biotypeTermObsolete.get(k) == 1]
+    if revived:
+        preCmds.append('''update VOC_Term set isObsolete = 0, _ModifiedBy_key = %d, modification_date = now()
+            where _Term_key in (%s)''' % (createdByKey, ','.join([str(k) for k in sorted(revived)])))
+
+    removed = [k for k, isObsolete in biotypeTermObsolete.items()
+        if isObsolete == 0 and k not in inputBiotypeTermKeys]
+    if removed:
+        postCmds.append('''update VOC_Term set isObsolete = 1, _ModifiedBy_key = %d, modification_date = now()
+            where _Term_key in (%s)''' % (createdByKey, ','.join([str(k) for k in sorted(removed)])))
+
+    diagFile.write('Biotype terms: %d added, %d no longer obsolete, %d marked obsolete\n' % \
+        (len(newBiotypeTerms), len(revived), len(removed)))
+
+    return preCmds, postCmds
+
+def verifyMarkerType(markerType, lineNum):
+    '''
+    # requires:
+    #
+    # effects:
+    #	Looks up the marker type; writes the loadlib.verifyMarkerType
+    #	error message to the error file if it is not found
+    #
+    # returns:
+    #	_marker_type_key, or 0 if the marker type does not exist
+    #
+    '''
+
+    markerTypeKey = markerTypeKeyLookup.get(markerType.lower(), 0)
+    if markerTypeKey == 0:
+        errorFile.write('Invalid Marker Type (%d) %s\n' % (lineNum, markerType))
+    else:
+        resolvedMarkerTypeKeys[markerType.lower()] = markerTypeKey
+    return markerTypeKey
+
 def verifyMode():
     '''
     # requires:
@@ -290,14 +488,13 @@ def sanityCheck(biotypeVocab, biotypeTerm, mcvTerms, primaryMCVTerm, markerType,
     else:
         errors.append(INVALID_VOCAB_ERROR % (lineNum, biotypeVocab) )
 
-    # Lookup the biotype _term_key for this vocab/term
+    # Lookup the biotype _term_key for this vocab/term; a term that is
+    # not in the vocabulary yet is added with the load
     if biotypeVocabKey:
-        biotypeTermKey = loadlib.verifyTerm('', biotypeVocabKey, biotypeTerm, lineNum, errorFile)
-        if biotypeTermKey == 0:
-            errors.append(INVALID_BIOTYPE_TERM_ERROR % (lineNum, biotypeTerm, biotypeVocab) )
+        biotypeTermKey = addBiotypeTerm(biotypeVocabKey, biotypeTerm)
 
     # lookup the _marker_type_key
-    markerTypeKey = loadlib.verifyMarkerType(markerType, lineNum, errorFile)
+    markerTypeKey = verifyMarkerType(markerType, lineNum)
     if markerTypeKey == 0:
         errors.append(INVALID_MARKER_TYPE_ERROR % (lineNum, markerType) )
 
@@ -306,14 +503,14 @@ def sanityCheck(biotypeVocab, biotypeTerm, mcvTerms, primaryMCVTerm, markerType,
     #
     tokens = mcvTerms.split('|')
     for r in tokens:
-        t = loadlib.verifyTerm('', MCV_VOCAB_KEY, r, lineNum, errorFile)
+        t = verifyTerm(MCV_VOCAB_KEY, r, lineNum)
         if t == 0:
             errors.append(INVALID_MCV_TERM_ERROR % (lineNum, r) )
         else:
             mcvTermKeys.append(t)
 
     # lookup the primary feature type
-    primaryMCVTermKey = loadlib.verifyTerm('', MCV_VOCAB_KEY, primaryMCVTerm, lineNum, errorFile)
+    primaryMCVTermKey = verifyTerm(MCV_VOCAB_KEY, primaryMCVTerm, lineNum)
     if primaryMCVTermKey == 0:
         errors.append(INVALID_MARKER_TYPE_ERROR % (lineNum, primaryMCVTerm) )
 
@@ -389,32 +586,308 @@ def processFile():
         else:
                 useMCVchildren = '0'
 
+        resolutionRows.append((biotypeVocabKey, biotypeTermKey, markerTypeKey, primaryMCVTermKey,
+                mcvTermKeys, useMCVchildren))
+
         for mcvTermKey in mcvTermKeys:
-                outputFile.write('%d|%d|%d|%d|%d|%s|%s|%s|%s|%s|%s\n' \
-                % (biotypeKey, biotypeVocabKey, biotypeTermKey, mcvTermKey, primaryMCVTermKey, markerTypeKey, useMCVchildren,
+                biotypeRows.append((biotypeKey, biotypeVocabKey, biotypeTermKey, mcvTermKey, primaryMCVTermKey, markerTypeKey, useMCVchildren,
                         createdByKey, createdByKey, cdate, cdate))
                 biotypeKey = biotypeKey + 1
 
     # end of "for line in inputFile.readlines():"
 
-    outputFile.close()
-    db.commit()
+def hashInput():
+    '''
+    # requires:
+    #
+    # effects:
+    #	Hashes the input file, and the biotype terms (fields 1, 2) that
+    #	the biotype vocabularies are kept in step with. The raw bytes are
+    #	hashed, so
+    #	the hash does not depend on the file encoding.
+    #
+    # returns:
+    #	(file hash, biotype terms hash)
+    #
+    '''
+
+    fp = open(inputFileName, 'rb')
+    data = fp.read()
+    fp.close()
+
+    terms = set()
+    for line in data.splitlines():
+        tokens = line.split(b'\t')
+        terms.add(b'\t'.join(tokens[:2]))
+
+    return (hashlib.sha1(data).hexdigest(),
+        hashlib.sha1(b'\n'.join(sorted(terms))).hexdigest())
 
-def bcpFiles():
+def loadMCVClosure():
     '''
     # requires:
     #
     # effects:
-    #	BCPs the data into the database
+    #	Reads the MCV DAG closure
+    #
+    # returns:
+    #	({MCV key : [descendent MCV key, ...]}, hash of the closure)
+    #
+    '''
+
+    results = genemodeldb.sql('''
+        select c._AncestorObject_key, c._DescendentObject_key
+        from DAG_Closure c, VOC_VocabDAG vd
+        where vd._Vocab_key = %d
+        and vd._DAG_key = c._DAG_key
+        order by c._AncestorObject_key, c._DescendentObject_key
+        ''' % (MCV_VOCAB_KEY), 'auto')
+
+    descendentsByMCVKey = {}
+    pairs = []
+    for r in results:
+        descendentsByMCVKey.setdefault(r['_AncestorObject_key'], []).append(r['_DescendentObject_key'])
+        pairs.append('%d|%d' % (r['_AncestorObject_key'], r['_DescendentObject_key']))
+
+    return descendentsByMCVKey, hashlib.sha1('\n'.join(pairs).encode()).hexdigest()
+
+def readState():
+    '''
+    # requires:
+    #
+    # effects:
+    #	Reads the state file of the last load
+    #
+    # returns:
+    #	the state (dictionary), or None if there is no usable state file
+    #
+    '''
+
+    try:
+        fp = open(stateFileName, 'r')
+        state = json.load(fp)
+        fp.close()
+    except:
+        return None
+
+    return state
+
+def writeState(rowCount):
+    '''
+    # requires:
+    #
+    # effects:
+    #	Writes the state file: the input file hashes, the MCV DAG closure
+    #	hash, the term and marker type keys resolved by this load and the
+    #	table row count
     #
     # returns:
     #	nothing
     #
     '''
 
-    bcp1 = '''%s %s %s %s '|' '\\n' mgd''' % (bcpCommand, biotypeTable, outputFileDir, bcpFileName)
-    diagFile.write('%s\n' % bcp1)
-    os.system(bcp1)
+    fileHash, termsHash = hashInput()
+    state = {'fileHash' : fileHash,
+        'termsHash' : termsHash,
+        'closureHash' : closureHash,
+        'termKeys' : resolvedTermKeys,
+        'markerTypeKeys' : resolvedMarkerTypeKeys,
+        'rowCount' : rowCount}
+
+    fp = open(stateFileName + '.new', 'w')
+    json.dump(state, fp, indent = 1, sort_keys = True)
+    fp.close()
+    os.replace(stateFileName + '.new', stateFileName)
+
+def checkState():
+    '''
+    # requires:
+    #
+    # effects:
+    #	Compares the input file, the vocabularies, the MCV DAG and the
+    #	table with the state of the last load. A change to the MCV DAG
+    #	alone needs the resolution file to be rewritten, so it is a
+    #	CHECK_MAPPING (no rows differ).
+    #
+    # returns:
+    #	CHECK_SKIP, CHECK_MAPPING or CHECK_RELOAD
+    #
+    '''
+
+    state = readState()
+    if state is None:
+        return CHECK_RELOAD
+
+    # the terms/marker types used by the last load must still have the
+    # same keys, or the table must be rebuilt
+    loadLookups()
+    for key, termKey in state['termKeys'].items():
+        vocabKey, term = key.split('|', 1)
+        if termKeyLookup.get((int(vocabKey), term)) != termKey:
+            return CHECK_RELOAD
+    for markerType, markerTypeKey in state['markerTypeKeys'].items():
+        if markerTypeKeyLookup.get(markerType) != markerTypeKey:
+            return CHECK_RELOAD
+
+    results = genemodeldb.sql('select count(*) as ctr from %s' % (biotypeTable), 'auto')
+    if results[0]['ctr'] != state['rowCount']:
+        return CHECK_RELOAD
+
+    fileHash, termsHash = hashInput()
+    if fileHash == state['fileHash']:
+        if os.path.exists(resolutionFileName) and \
+                loadMCVClosure()[1] == state.get('closureHash'):
+            return CHECK_SKIP
+        return CHECK_MAPPING
+    if termsHash == state['termsHash']:
+        return CHECK_MAPPING
+    return CHECK_RELOAD
+
+def diffRows():
+    '''
+    # requires:
+    #
+    # effects:
+    #	Compares the new rows with the rows in the table on everything but
+    #	_biotypemapping_key and the audit columns. The new rows that are
+    #	already in the table keep their key; the others get new keys.
+    #
+    # returns:
+    #	(list of keys to delete, list of rows to insert)
+    #
+    '''
+
+    results = genemodeldb.sql('''
+        select _BiotypeMapping_key, _BiotypeVocab_key, _BiotypeTerm_key, _MCVTerm_key,
+            _PrimaryMCVTerm_key, _Marker_Type_key, useMCVchildren
+        from %s
+        ''' % (biotypeTable), 'auto')
+
+    # {mapping : [_biotypemapping_key, ...]}
+    keysByMapping = {}
+    maxKey = 0
+    for r in results:
+        mapping = (r['_BiotypeVocab_key'], r['_BiotypeTerm_key'], r['_MCVTerm_key'],
+            r['_PrimaryMCVTerm_key'], r['_Marker_Type_key'], str(r['useMCVchildren']))
+        keysByMapping.setdefault(mapping, []).append(r['_BiotypeMapping_key'])
+        maxKey = max(maxKey, r['_BiotypeMapping_key'])
+
+    insertRows = []
+    for row in biotypeRows:
+        mapping = row[1:6] + (str(row[6]),)
+        keys = keysByMapping.get(mapping)
+        if keys:
+            keys.pop()
+        else:
+            maxKey = maxKey + 1
+            insertRows.append((maxKey,) + row[1:])
+
+    deleteKeys = []
+    for keys in keysByMapping.values():
+        deleteKeys.extend(keys)
+
+    return deleteKeys, insertRows
+
+def writeResolution():
+    '''
+    # requires:
+    #
+    # effects:
+    #	Writes the biotype resolution file; where useMCVchildren is set,
+    #	the MCV keys include the descendants of the mapped MCV terms
+    #	(from the MCV DAG closure)
+    #
+    # returns:
+    #	nothing
+    #
+    '''
+
+    global closureHash
+
+    # {MCV key : [descendent MCV key, ...]}
+    descendentsByMCVKey, closureHash = loadMCVClosure()
+
+    # {(vocab key, term key) : (marker type key, primary MCV key, set of MCV keys)}
+    # a raw biotype on more than one input line gets the lowest marker
+    # type key, and the lowest primary MCV key of the lines with that
+    # marker type, whatever the order of the input lines
+    resolution = {}
+    for vocabKey, termKey, markerTypeKey, primaryMCVKey, mcvKeys, useChildren in resolutionRows:
+        if (vocabKey, termKey) not in resolution:
+            resolution[(vocabKey, termKey)] = (markerTypeKey, primaryMCVKey, set())
+        elif (markerTypeKey, primaryMCVKey) < resolution[(vocabKey, termKey)][:2]:
+            resolution[(vocabKey, termKey)] = (markerTypeKey, primaryMCVKey,
+                resolution[(vocabKey, termKey)][2])
+        allowed = resolution[(vocabKey, termKey)][2]
+        for mcvKey in mcvKeys:
+            allowed.add(mcvKey)
+            if useChildren == '1':
+                allowed.update(descendentsByMCVKey.get(mcvKey, []))
+
+    entries = []
+    for (vocabKey, termKey), (markerTypeKey, primaryMCVKey, allowed) in resolution.items():
+        entries.append((vocabKey, termLookup[termKey], markerTypeKey, primaryMCVKey, allowed))
+
+    biotyperesolution.write(resolutionFileName, entries)
+    diagFile.write('%d raw biotypes written to %s\n' % (len(entries), resolutionFileName))
+
+def loadFiles(check):
+    '''
+    # requires: check, the checkState() result from before the load
+    #
+    # effects:
+    #	On a full reload (CHECK_RELOAD), loads the data into a staging
+    #	table, checks it (row count, unique _biotypemapping_key) and swaps
+    #	it into the table in one transaction.
+    #	Otherwise deletes/inserts only the rows that changed, in one
+    #	transaction.
+    #	The biotype vocabulary changes (see biotypeTermCmds()) are made
+    #	in the same transaction.
+    #	Nothing is changed if any step fails.
+    #	Writes the state file.
+    #
+    # returns:
+    #	nothing
+    #
+    '''
+
+    preCmds, postCmds = biotypeTermCmds()
+
+    try:
+        if check == CHECK_RELOAD:
+            diagFile.write('Loading %d rows into %s\n' % (len(biotypeRows), biotypeTable))
+            rows = genemodeldb.swapLoad(biotypeTable, biotypeRows, keyColumn = '_BiotypeMapping_key',
+                preCmds = preCmds, postCmds = postCmds)
+            diagFile.write('%d rows loaded into %s\n' % (rows, biotypeTable))
+        else:
+            deleteKeys, insertRows = diffRows()
+            diagFile.write('Applying the differences to %s: %d rows deleted, %d rows inserted\n' % \
+                (biotypeTable, len(deleteKeys), len(insertRows)))
+            try:
+                for cmd in preCmds:
+                    genemodeldb.sql(cmd, None)
+                if deleteKeys:
+                    genemodeldb.sql('delete from %s where _BiotypeMapping_key in (%s)' % \
+                        (biotypeTable, ','.join([str(k) for k in deleteKeys])), None)
+                if insertRows:
+                    genemodeldb.copyRows(biotypeTable, insertRows)
+                for cmd in postCmds:
+                    genemodeldb.sql(cmd, None)
+                genemodeldb.commit()
+            except:
+                genemodeldb.rollback()
+                raise
+    except Exception as e:
+        exit(1, 'Load of %s failed: %s' % (biotypeTable, e))
+
+    try:
+        writeResolution()
+    except Exception as e:
+        exit(1, 'Could not write %s: %s' % (resolutionFileName, e))
+
+    genemodeldb.close()
+
+    writeState(len(biotypeRows))
 
 def main():
     '''
@@ -432,20 +905,30 @@ def main():
     print('init()')
     init()
 
+    print('loadLookups()')
+    loadLookups()
+
+    print('checkState()')
+    check = checkState()
+    diagFile.write('Check: %s\n' % (check))
+
     print('processFile()')
     processFile()
 
     if not DEBUG and bcpon:
         print('sanity check PASSED : loading data')
-        bcpFiles()
+        loadFiles(check)
         exit(0)
     else:
         exit(1)
 
 if __name__ == '__main__':
 
-        #db.setTrace()
-        db.sql('start transaction', None)
+        if len(sys.argv) > 1 and sys.argv[1] == '--check':
+            initConfig()
+            print(checkState())
+            genemodeldb.close()
+            sys.exit(0)
 
         # do main processing
         main()
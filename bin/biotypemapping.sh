@@ -30,92 +30,30 @@ else
 fi
 
 #
-# truncate the MRK_BioTypeMapping table
+# Compare the input file and the vocabularies with the last load:
+#   skip    - nothing changed; nothing to do
+#   mapping - only the mapping columns changed; biotypemapping.py applies
+#             only the rows that differ
+#   reload  - biotypemapping.py reloads the table
 #
-date
-echo "Truncate the MRK_BioTypeMapping table"
-${MGD_DBSCHEMADIR}/table/MRK_BiotypeMapping_truncate.object
-STAT=$?
-if [ ${STAT} -ne 0 ]
-then
-	message="${message} truncate the MRK_BioTypeMapping table failed"
-else
-	message="${message} truncate the MRK_BioTypeMapping table successful" 
-fi
-echo ${message}
-
-#
-# load vocabulary terms
+# The biotype vocabularies are not reloaded with vocload: biotypemapping.py
+# adds the new biotype terms and marks the removed ones obsolete in the
+# same transaction as the table swap (or the row differences), so readers
+# never see an empty table or a mapping to a missing term.
 #
 date
-echo "Running biotype/vocload : ensembl.txt"
-rm -rf ${INPUTDIR}/ensembl.txt
-grep "^Ensembl" ${BIOTYPEINPUT_FILE_DEFAULT} > ${INPUTDIR}/ensembl.txt
-${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_ensembl.config
-STAT=$?
-if [ ${STAT} -ne 0 ]
-then
-	message="${message} ${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_ensembl.config failed"
-else
-	message="${message} ${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_ensembl.config successful" 
-fi
-echo ${message}
-
-date
-echo "Running biotype/vocload : ncbi.txt"
-rm -rf ${BIOTYPEINPUTDIR}/ncbi.txt
-grep "^NCBI" ${BIOTYPEINPUT_FILE_DEFAULT} > ${INPUTDIR}/ncbi.txt
-${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_ncbi.config
-STAT=$?
-if [ ${STAT} -ne 0 ]
-then
-	message="${message} ${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_ncbi.config failed"
-else
-	message="${message} ${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_ncbi.config successful" 
-fi
-echo ${message}
-
-date
-echo "Running biotype/vocload : mgp.txt"
-rm -rf ${INPUTDIR}/mgp.txt
-grep "^MGP" ${BIOTYPEINPUT_FILE_DEFAULT} > ${INPUTDIR}/mgp.txt
-${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_mgp.config
-STAT=$?
-if [ ${STAT} -ne 0 ]
+CHECK=`${PYTHON} ${GENEMODELLOAD}/bin/biotypemapping.py --check`
+if [ $? -ne 0 -o "${CHECK}" = "" ]
 then
-	message="${message} ${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_mgp.config failed"
-else
-	message="${message} ${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_mgp.config successful" 
+    CHECK=reload
 fi
-echo ${message}
+echo "biotypemapping check: ${CHECK}"
 
-date
-echo "Running biotype/vocload : ensemblreg.txt"
-rm -rf ${INPUTDIR}/ensemblreg.txt
-grep "^EnsemblR" ${BIOTYPEINPUT_FILE_DEFAULT} > ${INPUTDIR}/ensemblreg.txt
-${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_ensemblreg.config
-STAT=$?
-if [ ${STAT} -ne 0 ]
+if [ "${CHECK}" = "skip" ]
 then
-	message="${message} ${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_ensemblreg.config failed"
-else
-	message="${message} ${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_ensemblreg.config successful" 
-fi
-echo ${message}
-
-date
-echo "Running biotype/vocload : vistareg.txt"
-rm -rf ${INPUTDIR}/vistareg.txt
-grep "^VISTA" ${BIOTYPEINPUT_FILE_DEFAULT} > ${INPUTDIR}/vistareg.txt
-${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_vista.config
-STAT=$?
-if [ ${STAT} -ne 0 ]
-then
-	message="${message} ${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_vista.config failed"
-else
-	message="${message} ${VOCLOAD}/runSimpleFullLoadNoArchive.sh biotype_vista.config successful" 
+    echo "The biotype mapping file and vocabularies have not changed: skipping the load"
+    exit 0
 fi
-echo ${message}
 
 #
 # Execute biotypemapping.py
@@ -138,4 +76,4 @@ echo ${message}
 #
 cat ${BIOTYPELOG_ERROR}
 
-exit 0
+exit ${STAT}
@@ -0,0 +1,164 @@
+###########################################################################
+#
+#  biotypereader.py
+#
+#  Purpose:
+#
+#      Reads the raw biotype of each gene model ID from a provider file,
+#      plain or gzipped, one line at a time. The format is detected from
+#      the first lines of the file:
+#
+#          GTF_FORMAT      - Ensembl GTF; gene_id and gene_biotype from
+#                            the attributes (column 9)
+#          GENEINFO_FORMAT - NCBI gene_info; mouse (taxid 10090) rows,
+#                            GeneID (column 2) and type_of_gene (column 10)
+#          GM_FORMAT       - the gene model file (GM_FILE_DEFAULT);
+#                            gene model ID (column 1) and raw biotype
+#                            (column 7)
+#
+#      An ID found with more than one biotype is returned in the list of
+#      conflicts, for the caller to report.
+#
+#  Notes:  None
+#
+###########################################################################
+
+import gtfreader
+
+#
+# CONSTANTS
+#
+TAB = '\t'
+SCOLON = ';'
+
+GTF_FORMAT = 'gtf'
+GENEINFO_FORMAT = 'gene_info'
+GM_FORMAT = 'gm'
+
+MOUSE_TAXID = '10090'
+
+# number of lines read to detect the format
+DETECT_LINES = 100
+
+
+#
+# Purpose: Detect the format of a provider file from its first lines.
+# Returns: GTF_FORMAT, GENEINFO_FORMAT or GM_FORMAT
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: IOError if the file cannot be read
+#
+def detectFormat (fileName):
+    fileFormat = GM_FORMAT
+
+    fp = gtfreader.openInput(fileName)
+    for i, line in enumerate(fp):
+        if i >= DETECT_LINES:
+            break
+        if line.startswith('#tax_id'):
+            fileFormat = GENEINFO_FORMAT
+            break
+        if line[0] == '#':
+            continue
+        columnList = line.split(TAB)
+        if len(columnList) == 9 and 'gene_id "' in columnList[8]:
+            fileFormat = GTF_FORMAT
+        break
+    fp.close()
+
+    return fileFormat
+
+
+#
+# Purpose: Read the gene model ID and raw biotype of each line.
+# Returns: Generator of (gmID, rawBioType)
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: IOError if the file cannot be read
+#
+def readBiotypes (fileName, fileFormat = None):
+    if fileFormat is None:
+        fileFormat = detectFormat(fileName)
+
+    fp = gtfreader.openInput(fileName)
+
+    if fileFormat == GTF_FORMAT:
+        for line in fp:
+            if line[0] == '#':
+                continue
+            attributes = line.split(TAB, 8)[8]
+            yield (attributeValue(attributes, 'gene_id'), \
+                attributeValue(attributes, 'gene_biotype'))
+
+    elif fileFormat == GENEINFO_FORMAT:
+        prefix = MOUSE_TAXID + TAB
+        for line in fp:
+            if not line.startswith(prefix):
+                continue
+            columnList = line.split(TAB, 10)
+            yield (columnList[1], columnList[9])
+
+    else:
+        for line in fp:
+            columnList = line[:-1].split(TAB)
+            yield (columnList[0], columnList[6])
+
+    fp.close()
+
+
+#
+# Purpose: Get the value of one GTF attribute; the attributes are read
+#          only as far as the one that is wanted.
+# Returns: The value, or '' if the attribute is not found
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def attributeValue (attributes, name):
+    name = name + ' '
+    start = 0
+    while True:
+        end = attributes.find(SCOLON, start)
+        if end < 0:
+            return ''
+        a = attributes[start:end].strip()
+        if a.startswith(name):
+            return a.split('"')[1]
+        start = end + 1
+
+
+#
+# Purpose: Load the raw biotype of each gene model ID; lines that repeat
+#          an ID with the same biotype are ignored.
+# Returns: ({gmID:rawBioType, ...}, [(gmID, rawBioType, otherRawBioType), ...])
+#          The second is the list of conflicts: IDs read with a different
+#          biotype than the one kept. The first biotype read is kept,
+#          unless keepLast is set.
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: IOError if the file cannot be read
+#
+def loadBiotypes (fileName, fileFormat = None, keepLast = False):
+    biotypeByGMID = {}
+    conflicts = []
+
+    # the rows of a gene are usually together; skip the repeats cheaply
+    lastId = None
+    lastBiotype = None
+
+    for gmId, biotype in readBiotypes(fileName, fileFormat):
+        if gmId == lastId and biotype == lastBiotype:
+            continue
+        lastId = gmId
+        lastBiotype = biotype
+
+        if gmId in biotypeByGMID:
+            b = biotypeByGMID[gmId]
+            if b == biotype:
+                continue
+            conflicts.append((gmId, b, biotype))
+            if not keepLast:
+                continue
+        biotypeByGMID[gmId] = biotype
+
+    return biotypeByGMID, conflicts
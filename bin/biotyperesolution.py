@@ -0,0 +1,178 @@
+###########################################################################
+#
+#  biotyperesolution.py
+#
+#  Purpose:
+#
+#      Reads and writes the biotype resolution file (BIOTYPE_RESOLUTION_FILE)
+#      that biotypemapping.py writes after each load of MRK_BiotypeMapping.
+#
+#      For each raw biotype of each provider vocabulary the file holds the
+#      marker type key, the primary MCV key and the MCV keys the biotype
+#      allows. When useMCVchildren is set, the MCV keys already include
+#      all the descendants of the mapped MCV terms, so readers do not walk
+#      the MCV DAG.
+#
+#      File layout (little-endian; the file is read through mmap):
+#
+#          header  : magic, version, entry count, MCV key count,
+#                    string bytes
+#          entries : one per (vocab key, raw biotype), sorted:
+#                    vocab key, term offset, term length,
+#                    marker type key, primary MCV key,
+#                    MCV offset, MCV count
+#          MCV keys: the MCV keys of all entries
+#          strings : the raw biotypes, utf-8
+#
+#  Notes:  None
+#
+###########################################################################
+
+import os
+import mmap
+import struct
+
+#
+# CONSTANTS
+#
+MAGIC = b'MGIBTRES'
+VERSION = 1
+
+HEADER = struct.Struct('<8sIIII')
+ENTRY = struct.Struct('<IIIIIII')
+KEY = struct.Struct('<I')
+
+
+#
+# Purpose: Raised when the file is not a biotype resolution file of this
+#          version, or is empty, truncated or damaged.
+#
+class Error (Exception):
+    pass
+
+
+#
+# Purpose: Write the biotype resolution file from a list of
+#          (vocabKey, rawBiotype, markerTypeKey, primaryMCVKey, [mcvKey, ...]);
+#          the file is replaced only when it is complete.
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Creates/replaces the file
+# Throws: IOError if the file cannot be written
+#
+def write (fileName, entries):
+    entryData = []
+    mcvData = []
+    stringData = []
+    mcvOffset = 0
+    stringOffset = 0
+
+    for vocabKey, term, markerTypeKey, primaryMCVKey, mcvKeys in sorted(entries):
+        term = term.encode('utf-8')
+        mcvKeys = sorted(set(mcvKeys))
+        entryData.append(ENTRY.pack(vocabKey, stringOffset, len(term),
+            markerTypeKey, primaryMCVKey, mcvOffset, len(mcvKeys)))
+        for mcvKey in mcvKeys:
+            mcvData.append(KEY.pack(mcvKey))
+        stringData.append(term)
+        mcvOffset = mcvOffset + len(mcvKeys)
+        stringOffset = stringOffset + len(term)
+
+    fp = open(fileName + '.new', 'wb')
+    fp.write(HEADER.pack(MAGIC, VERSION, len(entryData), mcvOffset, stringOffset))
+    fp.write(b''.join(entryData))
+    fp.write(b''.join(mcvData))
+    fp.write(b''.join(stringData))
+    fp.close()
+    os.replace(fileName + '.new', fileName)
+    return
+
+
+#
+# Purpose: Read-only view of a biotype resolution file.
+#
+class Resolution:
+
+    def __init__ (self, fileName):
+        self.data = None
+        fp = open(fileName, 'rb')
+        try:
+            self.data = mmap.mmap(fp.fileno(), 0, access = mmap.ACCESS_READ)
+            self.map(fileName)
+        except Error:
+            self.close()
+            raise
+        except (ValueError, struct.error, UnicodeDecodeError) as e:
+            # an empty file cannot be mapped; a short or damaged one
+            # cannot be unpacked
+            self.close()
+            raise Error('%s is not a readable biotype resolution file: %s' % (fileName, e))
+        finally:
+            fp.close()
+
+    #
+    # Purpose: Check the header and index the entries.
+    # Throws: Error if the file is not a complete resolution file of this
+    #         version
+    #
+    def map (self, fileName):
+        magic, version, self.entryCount, mcvCount, stringSize = \
+            HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise Error('%s is not a version %d biotype resolution file' % (fileName, VERSION))
+
+        self.entryStart = HEADER.size
+        self.mcvStart = self.entryStart + self.entryCount * ENTRY.size
+        self.stringStart = self.mcvStart + mcvCount * KEY.size
+        if len(self.data) != self.stringStart + stringSize:
+            raise Error('%s is truncated' % (fileName))
+
+        # {(vocabKey, rawBiotype) : entry number}
+        self.index = {}
+        for i in range(self.entryCount):
+            vocabKey, term = self.entry(i)[:2]
+            self.index[(vocabKey, term)] = i
+
+    #
+    # Purpose: Get one entry.
+    # Returns: (vocabKey, rawBiotype, markerTypeKey, primaryMCVKey, offset, count)
+    #
+    def entry (self, i):
+        vocabKey, termOffset, termLength, markerTypeKey, primaryMCVKey, \
+            mcvOffset, mcvCount = ENTRY.unpack_from(self.data, self.entryStart + i * ENTRY.size)
+        start = self.stringStart + termOffset
+        term = self.data[start:start + termLength].decode('utf-8')
+        return (vocabKey, term, markerTypeKey, primaryMCVKey, mcvOffset, mcvCount)
+
+    #
+    # Purpose: Resolve a raw biotype of a provider vocabulary.
+    # Returns: (markerTypeKey, primaryMCVKey, (mcvKey, ...)), or None
+    #
+    def lookup (self, vocabKey, rawBiotype):
+        i = self.index.get((vocabKey, rawBiotype))
+        if i is None:
+            return None
+        vocabKey, term, markerTypeKey, primaryMCVKey, mcvOffset, mcvCount = self.entry(i)
+        start = self.mcvStart + mcvOffset * KEY.size
+        mcvKeys = struct.unpack_from('<%dI' % (mcvCount), self.data, start)
+        return (markerTypeKey, primaryMCVKey, mcvKeys)
+
+    #
+    # Purpose: Get the marker type key of each raw biotype, for all the
+    #          provider vocabularies; a raw biotype in more than one
+    #          vocabulary gets its lowest marker type key.
+    # Returns: {rawBiotype : markerTypeKey, ...}
+    #
+    def markerTypeKeys (self):
+        markerTypeKeyByRawBioType = {}
+        for i in range(self.entryCount):
+            term, markerTypeKey = self.entry(i)[1:3]
+            if term not in markerTypeKeyByRawBioType or \
+                    markerTypeKey < markerTypeKeyByRawBioType[term]:
+                markerTypeKeyByRawBioType[term] = markerTypeKey
+        return markerTypeKeyByRawBioType
+
+    def close (self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
@@ -0,0 +1,471 @@
+###########################################################################
+#
+#  featurestore.py
+#
+#  Purpose:
+#
+#      Compact store of the provider GFF features of MGIreg.gff3.py
+#      (providerInfo), in place of a dictionary of lists of
+#      (mcvterm, start, end, strand, dbxRef) string tuples:
+#
+#          start, end      - int arrays
+#          mcvterm, strand - small-integer codes into tables of the
+#                            distinct values
+#          dbxRef          - one contiguous utf-8 buffer, and an array of
+#                            the offset of each feature's value in it
+#          provider id     - index of the range of features of each id
+#
+#      The store is one provider's features, so the provider itself is
+#      not stored per feature.
+#
+#      Features are added with add(); finish() groups them by provider id
+#      (keeping the order they were added in) and builds the id index.
+#      After finish() the store is read like the dictionary it replaces:
+#      store[id], store.get(id), id in store, each giving the same list
+#      of (mcvterm, start, end, strand, dbxRef) tuples.
+#
+#      A coordinate that does not read back the same from an int (a
+#      leading zero or sign, or not a number) is kept as it was given.
+#
+#      write() saves a store as an index file of its source GFF, and
+#      MappedStore reads one through mmap, so that a GFF that has not
+#      changed since the index was written is not parsed again. The
+#      index records the source key (path, size, modification time) it
+#      was built from; an index of another key is not read.
+#
+#      Index file layout (native byte order, each section padded to 8
+#      bytes; the file is a local cache, not copied between machines):
+#
+#          header      : magic, version, byte order mark, feature count,
+#                        id count, tables size, id strings size,
+#                        dbxRef strings size
+#          tables      : pickle of (source key, mcvterm table, strand
+#                        table, {feature number : (start, end)})
+#          features    : start (q), end (q), dbxRef offset (Q, count + 1),
+#                        mcvterm code (H), strand code (H)
+#          ids         : sorted by their utf-8 bytes: id string offset
+#                        (Q, count + 1), first feature (I), feature count (I)
+#          strings     : the ids, then the dbxRefs, utf-8
+#
+#  Notes:  None
+#
+###########################################################################
+
+import os
+import mmap
+import pickle
+import struct
+from array import array
+
+#
+# CONSTANTS
+#
+
+# coordinate array value of a feature whose coordinates are kept as strings
+EXACT = -1
+
+MAGIC = b'MGIFEATS'
+VERSION = 1
+BYTE_ORDER_MARK = 0x01020304
+
+HEADER = struct.Struct('=8sIIQQQQQ')
+
+
+#
+# Purpose: Raised when an index file is not a feature index of this
+#          version, cannot be read, or is not of the given source.
+#
+class Error (Exception):
+    pass
+
+
+#
+# Purpose: Provider GFF features by provider id.
+#
+class FeatureStore:
+
+    def __init__ (self):
+        self.starts = array('q')
+        self.ends = array('q')
+
+        self.terms = []
+        self.termCodes = {}
+        self.termArray = array('H')
+
+        self.strands = []
+        self.strandCodes = {}
+        self.strandArray = array('H')
+
+        self.dbxRefs = bytearray()
+        self.dbxRefOffsets = array('Q', [0])
+
+        # {feature number : (start, end)} for the coordinates that are
+        # not stored in the arrays
+        self.exact = {}
+
+        # build: provider id number of each feature
+        self.idNumbers = {}
+        self.featureIds = array('L')
+
+        # after finish(): {provider id : k}; the features of the k'th id
+        # are idStarts[k] to idStarts[k + 1]
+        self.index = {}
+        self.idStarts = array('L', [0])
+
+    #
+    # add one feature of a provider id
+    #
+    def add (self, id, mcvterm, start, end, strand, dbxRef):
+        i = len(self.starts)
+
+        try:
+            startValue = int(start)
+            endValue = int(end)
+            if str(startValue) != start or str(endValue) != end or startValue == EXACT:
+                raise ValueError
+        except ValueError:
+            startValue = endValue = EXACT
+            self.exact[i] = (start, end)
+        self.starts.append(startValue)
+        self.ends.append(endValue)
+
+        self.termArray.append(self.code(self.terms, self.termCodes, mcvterm))
+        self.strandArray.append(self.code(self.strands, self.strandCodes, strand))
+
+        self.dbxRefs += dbxRef.encode('utf-8')
+        self.dbxRefOffsets.append(len(self.dbxRefs))
+
+        self.featureIds.append(self.code([], self.idNumbers, id))
+
+    def code (self, values, codes, value):
+        c = codes.get(value)
+        if c is None:
+            c = len(codes)
+            codes[value] = c
+            values.append(value)
+        return c
+
+    #
+    # group the features by provider id and build the id index
+    #
+    def finish (self):
+        # ids are numbered in the order they were first added, so the
+        # features are already grouped when the numbers never go down
+        # (the features of each id are on consecutive lines)
+        featureIds = self.featureIds
+        if all(featureIds[n - 1] <= featureIds[n] for n in range(1, len(featureIds))):
+            self.buildIndex(featureIds)
+            self.dbxRefs = bytes(self.dbxRefs)
+            return
+
+        order = sorted(range(len(self.starts)), key = featureIds.__getitem__)
+
+        dbxRefs = bytearray()
+        dbxRefOffsets = array('Q', [0])
+        for i in order:
+            dbxRefs += self.dbxRefs[self.dbxRefOffsets[i]:self.dbxRefOffsets[i + 1]]
+            dbxRefOffsets.append(len(dbxRefs))
+
+        newNumber = dict([(i, n) for n, i in enumerate(order)])
+        self.exact = dict([(newNumber[i], v) for i, v in self.exact.items()])
+
+        self.starts = array('q', [self.starts[i] for i in order])
+        self.ends = array('q', [self.ends[i] for i in order])
+        self.termArray = array('H', [self.termArray[i] for i in order])
+        self.strandArray = array('H', [self.strandArray[i] for i in order])
+        self.dbxRefs = bytes(dbxRefs)
+        self.dbxRefOffsets = dbxRefOffsets
+
+        self.buildIndex([featureIds[i] for i in order])
+
+    #
+    # build the id index from the id number of each (grouped) feature
+    #
+    def buildIndex (self, featureIds):
+        ids = sorted(self.idNumbers, key = self.idNumbers.__getitem__)
+        self.index = {}
+        self.idStarts = array('L')
+        for n, i in enumerate(featureIds):
+            if n == 0 or i != featureIds[n - 1]:
+                self.index[ids[i]] = len(self.idStarts)
+                self.idStarts.append(n)
+        self.idStarts.append(len(featureIds))
+
+        self.termCodes = {}
+        self.strandCodes = {}
+        self.idNumbers = {}
+        self.featureIds = array('L')
+
+    #
+    # the features of an id, decoded in one loop, as this is called for
+    # each marker of the report
+    #
+    def get (self, id, default = None):
+        k = self.index.get(id)
+        if k is None:
+            return default
+
+        starts = self.starts
+        ends = self.ends
+        dbxRefs = self.dbxRefs
+        offsets = self.dbxRefOffsets
+        terms = self.terms
+        termArray = self.termArray
+        strands = self.strands
+        strandArray = self.strandArray
+
+        features = []
+        for i in range(self.idStarts[k], self.idStarts[k + 1]):
+            start = starts[i]
+            if start == EXACT:
+                start, end = self.exact[i]
+            else:
+                start = str(start)
+                end = str(ends[i])
+            features.append((terms[termArray[i]], start, end, strands[strandArray[i]],
+                dbxRefs[offsets[i]:offsets[i + 1]].decode('utf-8')))
+        return features
+
+    def __getitem__ (self, id):
+        features = self.get(id)
+        if features is None:
+            raise KeyError(id)
+        return features
+
+    def __contains__ (self, id):
+        return id in self.index
+
+    def __len__ (self):
+        return len(self.index)
+
+    #
+    # Purpose: Copy the features of some provider ids.
+    # Returns: A FeatureStore of the ids in ids that have features
+    #
+    def select (self, ids):
+        store = FeatureStore()
+        for id in ids:
+            for f in self.get(id, []):
+                store.add(id, *f)
+        store.finish()
+        return store
+
+
+#
+# Purpose: Get the key an index of a source file is kept under.
+# Returns: (absolute path, size, modification time in ns)
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: OSError if the file does not exist
+#
+def sourceKey (fileName):
+    st = os.stat(fileName)
+    return (os.path.abspath(fileName), st.st_size, st.st_mtime_ns)
+
+
+def padding (size):
+    return b'\0' * (-size % 8)
+
+
+#
+# Purpose: Write a (finished) FeatureStore as the index file of the
+#          source with the given sourceKey(); the file is replaced only
+#          when it is complete.
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Creates/replaces the file
+# Throws: IOError if the file cannot be written
+#
+def write (fileName, store, key):
+    ids = sorted([(id.encode('utf-8'), k) for id, k in store.index.items()])
+    idOffsets = array('Q', [0])
+    idFirst = array('I')
+    idCount = array('I')
+    for id, k in ids:
+        idOffsets.append(idOffsets[-1] + len(id))
+        idFirst.append(store.idStarts[k])
+        idCount.append(store.idStarts[k + 1] - store.idStarts[k])
+    idStrings = b''.join([id for id, k in ids])
+
+    tables = pickle.dumps((key, store.terms, store.strands, store.exact), pickle.HIGHEST_PROTOCOL)
+
+    fp = open(fileName + '.new', 'wb')
+    fp.write(HEADER.pack(MAGIC, VERSION, BYTE_ORDER_MARK, len(store.starts), len(ids),
+        len(tables), len(idStrings), len(store.dbxRefs)))
+    for data in (tables, store.starts.tobytes(), store.ends.tobytes(), store.dbxRefOffsets.tobytes(),
+                 store.termArray.tobytes(), store.strandArray.tobytes(),
+                 idOffsets.tobytes(), idFirst.tobytes(), idCount.tobytes(),
+                 idStrings, store.dbxRefs):
+        fp.write(data)
+        fp.write(padding(len(data)))
+    fp.close()
+    os.replace(fileName + '.new', fileName)
+    return
+
+
+#
+# Purpose: Read-only view of a feature index file, with the lookups of
+#          FeatureStore.
+#
+class MappedStore:
+
+    def __init__ (self, fileName, key):
+        self.data = None
+        self.view = None
+
+        fp = open(fileName, 'rb')
+        try:
+            self.data = mmap.mmap(fp.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            raise Error('%s is empty' % (fileName))
+        finally:
+            fp.close()
+
+        # an index that cannot be read is reported as Error (the caller
+        # builds it again), and the mapping is not left open
+        try:
+            self.map(fileName, key)
+        except Error:
+            self.close()
+            raise
+        except (pickle.UnpicklingError, EOFError, ValueError, TypeError,
+                IndexError, AttributeError, struct.error) as e:
+            self.close()
+            raise Error('%s is corrupt: %s' % (fileName, e))
+
+    def map (self, fileName, key):
+        if len(self.data) < HEADER.size:
+            raise Error('%s is truncated' % (fileName))
+        magic, version, byteOrderMark, featureCount, idCount, tableSize, idSize, dbxRefSize = \
+            HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION or byteOrderMark != BYTE_ORDER_MARK:
+            raise Error('%s is not a version %d feature index' % (fileName, VERSION))
+
+        # (name, type, item count) of each section after the tables
+        sections = [('starts', 'q', featureCount), ('ends', 'q', featureCount),
+                    ('dbxRefOffsets', 'Q', featureCount + 1),
+                    ('termArray', 'H', featureCount), ('strandArray', 'H', featureCount),
+                    ('idOffsets', 'Q', idCount + 1), ('idFirst', 'I', idCount), ('idCount', 'I', idCount)]
+
+        pos = HEADER.size + tableSize + len(padding(tableSize))
+        end = pos
+        for name, typecode, count in sections:
+            size = count * array(typecode).itemsize
+            end = end + size + len(padding(size))
+        end = end + idSize + len(padding(idSize)) + dbxRefSize + len(padding(dbxRefSize))
+        if len(self.data) != end:
+            raise Error('%s is truncated' % (fileName))
+
+        # a damaged pickle can raise almost any exception
+        try:
+            tables = pickle.loads(self.data[HEADER.size:HEADER.size + tableSize])
+        except Exception as e:
+            raise Error('%s: tables cannot be read: %r' % (fileName, e))
+        key2, self.terms, self.strands, self.exact = tables
+        if tuple(key2) != tuple(key):
+            raise Error('%s is the index of another file: %s' % (fileName, key2))
+
+        self.view = memoryview(self.data)
+        for name, typecode, count in sections:
+            size = count * array(typecode).itemsize
+            setattr(self, name, self.view[pos:pos + size].cast(typecode))
+            pos = pos + size + len(padding(size))
+        self.idStringStart = pos
+        self.dbxRefStart = pos + idSize + len(padding(idSize))
+        self.idTotal = idCount
+
+    #
+    # Purpose: Find the features of a provider id (binary search of the
+    #          sorted ids).
+    # Returns: (first feature, feature count), or None
+    #
+    def lookup (self, id):
+        id = id.encode('utf-8')
+        lo = 0
+        hi = self.idTotal
+        while lo < hi:
+            k = (lo + hi) // 2
+            start = self.idStringStart + self.idOffsets[k]
+            other = self.data[start:self.idStringStart + self.idOffsets[k + 1]]
+            if other < id:
+                lo = k + 1
+            elif other > id:
+                hi = k
+            else:
+                return (self.idFirst[k], self.idCount[k])
+        return None
+
+    def feature (self, i):
+        if self.starts[i] == EXACT:
+            start, end = self.exact[i]
+        else:
+            start = str(self.starts[i])
+            end = str(self.ends[i])
+        return (self.terms[self.termArray[i]], start, end, self.strands[self.strandArray[i]],
+            self.data[self.dbxRefStart + self.dbxRefOffsets[i]:
+                      self.dbxRefStart + self.dbxRefOffsets[i + 1]].decode('utf-8'))
+
+    def get (self, id, default = None):
+        found = self.lookup(id)
+        if found is None:
+            return default
+        first, count = found
+        return [self.feature(i) for i in range(first, first + count)]
+
+    def __contains__ (self, id):
+        return self.lookup(id) is not None
+
+    def __len__ (self):
+        return self.idTotal
+
+    #
+    # Purpose: Copy the features of some provider ids; the arrays are
+    #          copied as they are, with the same mcvterm/strand tables.
+    # Returns: A (finished) FeatureStore of the ids in ids that have features
+    #
+    def select (self, ids):
+        store = FeatureStore()
+        store.terms = list(self.terms)
+        store.strands = list(self.strands)
+        dbxRefs = bytearray()
+
+        for id in ids:
+            found = self.lookup(id)
+            if found is None:
+                continue
+            first, count = found
+            last = first + count
+            n = len(store.starts)
+
+            store.index[id] = len(store.idStarts) - 1
+            store.starts.frombytes(self.starts[first:last].tobytes())
+            store.ends.frombytes(self.ends[first:last].tobytes())
+            store.termArray.frombytes(self.termArray[first:last].tobytes())
+            store.strandArray.frombytes(self.strandArray[first:last].tobytes())
+            store.idStarts.append(len(store.starts))
+
+            start = self.dbxRefOffsets[first]
+            shift = len(dbxRefs) - start
+            dbxRefs += self.data[self.dbxRefStart + start:self.dbxRefStart + self.dbxRefOffsets[last]]
+            store.dbxRefOffsets.extend([o + shift for o in self.dbxRefOffsets[first + 1:last + 1]])
+
+            if self.exact:
+                for i in range(first, last):
+                    if i in self.exact:
+                        store.exact[n + i - first] = self.exact[i]
+
+        store.dbxRefs = bytes(dbxRefs)
+        return store
+
+    def close (self):
+        for name in ('starts', 'ends', 'dbxRefOffsets', 'termArray', 'strandArray',
+                     'idOffsets', 'idFirst', 'idCount'):
+            if getattr(self, name, None) is not None:
+                getattr(self, name).release()
+                setattr(self, name, None)
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        if self.data is not None:
+            self.data.close()
+            self.data = None
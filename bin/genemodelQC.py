@@ -21,8 +21,6 @@
 #      files that are sourced by the wrapper script:
 #
 #          GM_PROVIDER
-#          GM_FILE_BCP
-#          ASSOC_FILE_BCP
 #          GM_TEMP_TABLE
 #          ASSOC_TEMP_TABLE
 #          INVALID_MARKER_RPT
@@ -57,12 +55,6 @@
 #
 #  Outputs:
 #
-#      - BCP file (${GM_FILE_BCP}) for loading the gene model file
-#        into a temp table
-#
-#      - BCP file (${ASSOC_FILE_BCP}) for loading the association file
-#        into a temp table
-#
 #      - Load-ready association file (${ASSOC_FILE_LOAD})
 #
 #      - QC report (${INVALID_MARKER_RPT})
@@ -80,13 +72,7 @@
 #      1:  An exception occurred
 #      2:  Discrepancy errors detected in the input files
 #
-#  Assumes:
-#
-#      This script assumes that the wrapper script has already created the
-#      tables in tempdb for loading the input records into. The table
-#      names are defined by the environment variables ${GM_TEMP_TABLE} and
-#      ${ASSOC_TEMP_TABLE}. The wrapper script will also take care of
-#      dropping the table after this script terminates.
+#  Assumes:  Nothing
 #
 #  Implementation:
 #
@@ -95,12 +81,21 @@
 #      1) Validate the arguments to the script.
 #      2) Perform initialization steps.
 #      3) Open the input/output files.
-#      4) Load the records from the input files into the temp tables.
-#      5) Generate the QC reports.
-#      6) Close the input/output files.
-#      7) If this is a "live" run, create the load-ready association file
+#      4) Create the (unlogged) temp tables (${GM_TEMP_TABLE},
+#         ${ASSOC_TEMP_TABLE}).
+#      5) Load the records from the input files into the temp tables
+#         (both tables at the same time), then index and analyze them.
+#      6) Generate the QC reports.
+#      7) Close the input/output files.
+#      8) Drop the temp tables.
+#      9) If this is a "live" run, create the load-ready association file
 #         from the associations that do not have any discrepancies.
 #
+#      The database work is done in a single session, except for the
+#      association load, which runs on a second connection at the same
+#      time as the gene model load. The temp tables are dropped even if
+#      an error occurs.
+#
 #  Notes:  None
 #
 ###########################################################################
@@ -117,8 +112,11 @@
 import sys
 import os
 import re
+import io
+import time
+import threading
 import mgi_utils
-import db
+import genemodeldb
 
 #
 #  CONSTANTS
@@ -134,10 +132,6 @@ USAGE = 'genemodelQC.py  assoc_file  gm_file'
 provider = os.environ['GM_PROVIDER']
 liveRun = os.environ['LIVE_RUN']
 
-bcpCommand = os.environ['PG_DBUTILS'] + '/bin/bcpin.csh'
-
-gmBCPFile = os.environ['GM_FILE_BCP']
-assocBCPFile = os.environ['ASSOC_FILE_BCP']
 gmTempTable = os.environ['GM_TEMP_TABLE']
 assocTempTable = os.environ['ASSOC_TEMP_TABLE']
 
@@ -164,6 +158,9 @@ warningReportNames = []
 
 assoc = {}
 
+# the temp tables this run created (and so may drop)
+createdTables = []
+
 
 #
 # Purpose: Validate the arguments to the script.
@@ -192,7 +189,7 @@ def checkArgs ():
 # Throws: Nothing
 #
 def openFiles ():
-    global fpGM, fpAssoc, fpGMBCP, fpAssocBCP
+    global fpGM, fpAssoc
     global fpInvMrkRpt, fpSecMrkRpt, fpMissGMRpt, fpChrDiscrepRpt
     global fpDupGMIDRpt, fpRptNamesRpt
     #
@@ -209,20 +206,6 @@ def openFiles ():
         print('Cannot open input file: ' + assocFile)
         sys.exit(1)
 
-    #
-    # Open the output files.
-    #
-    try:
-        fpGMBCP = open(gmBCPFile, 'w')
-    except:
-        print('Cannot open output file: ' + gmBCPFile)
-        sys.exit(1)
-    try:
-        fpAssocBCP = open(assocBCPFile, 'w')
-    except:
-        print('Cannot open output file: ' + assocBCPFile)
-        sys.exit(1)
-
     #
     # Open the report files.
     #
@@ -269,7 +252,7 @@ def openFiles ():
 # Throws: Nothing
 #
 def closeFiles ():
-    global fpGM, fpAssoc, fpGMBCP, fpAssocBCP
+    global fpGM, fpAssoc
     global fpInvMrkRpt, fpSecMrkRpt, fpMissGMRpt, fpChrDiscrepRpt
     global fpDupGMIDRpt, fpRptNamesRpt
 
@@ -283,6 +266,119 @@ def closeFiles ():
     return
 
 
+#
+# Purpose: Write the elapsed time for a step to the log.
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def logElapsed (step, startTime):
+    print('%s: %.2f seconds' % (step, time.time() - startTime))
+    sys.stdout.flush()
+    return
+
+
+#
+# Purpose: Create the temp tables for the input data. They are unlogged
+#          tables rather than temporary ones, so that the second
+#          connection used by loadTempTables() can load into them.
+#          Each table is committed and recorded as soon as it is created,
+#          so that dropTempTables() drops only the tables of this run.
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Sets global variables.
+# Throws: psycopg2.Error if a table cannot be created (e.g. another run
+#         already has it)
+#
+def createTempTables ():
+
+    print('Create temp tables for the input data')
+    sys.stdout.flush()
+
+    startTime = time.time()
+
+    genemodeldb.sql('''create unlogged table %s (
+                gmID text not null,
+                chromosome varchar(8) not null,
+                startCoordinate float not null,
+                endCoordinate float not null,
+                strand char(1) not null,
+                description text not null
+                )''' % (gmTempTable), None)
+    genemodeldb.sql('grant all on %s to public' % (gmTempTable), None)
+    genemodeldb.commit()
+    createdTables.append(gmTempTable)
+
+    genemodeldb.sql('''create unlogged table %s (
+                mgiID text not null,
+                gmID text not null
+                )''' % (assocTempTable), None)
+    genemodeldb.sql('grant all on %s to public' % (assocTempTable), None)
+    genemodeldb.commit()
+    createdTables.append(assocTempTable)
+
+    logElapsed('Create the temp tables', startTime)
+    return
+
+
+#
+# Purpose: Drop the temp tables that this run created. The tables of a
+#          concurrent run with the same names (e.g. Ensembl_GM for the
+#          ensembl and ensemblreg QC) are left alone.
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Writes any error to the log instead of raising it, so that it
+#          does not hide the error that ended the run.
+# Throws: Nothing
+#
+def dropTempTables ():
+
+    print('Drop the temp tables')
+    sys.stdout.flush()
+
+    try:
+        genemodeldb.rollback()
+    except Exception as e:
+        print('Cannot roll back before dropping the temp tables: %s' % (e))
+
+    for table in createdTables:
+        try:
+            genemodeldb.sql('drop table if exists %s' % (table), None)
+            genemodeldb.commit()
+        except Exception as e:
+            print('Cannot drop temp table %s: %s' % (table, e))
+            try:
+                genemodeldb.rollback()
+            except Exception:
+                pass
+    sys.stdout.flush()
+    return
+
+
+#
+# Purpose: Load a temp table on its own connection, so that it can run
+#          at the same time as a load in the session.
+# Returns: Nothing
+# Assumes: The table has been committed (see createTempTables()).
+# Effects: Sets result['rows'] to the number of rows loaded, or
+#          result['error'] to the exception if the load fails.
+# Throws: Nothing
+#
+def copyInConnection (table, data, result):
+    conn = None
+    try:
+        conn = genemodeldb.openConnection()
+        result['rows'] = genemodeldb.copyIn(table, data, conn = conn)
+        conn.commit()
+    except Exception as e:
+        result['error'] = e
+    finally:
+        if conn is not None:
+            conn.close()
+    return
+
+
 #
 # Purpose: Load the data from the input files into the temp tables.
 # Returns: Nothing
@@ -293,13 +389,16 @@ def closeFiles ():
 def loadTempTables ():
     global assoc
 
-    print('Create a bcp file from the gene model input file')
+    print('Validate the gene model input file')
     sys.stdout.flush()
 
+    startTime = time.time()
+
     #
     # Read each record from the gene model input file, perform validation
-    # checks and write them to a bcp file.
+    # checks and add them to the data to be copied into the temp table.
     #
+    gmData = io.StringIO()
     line = fpGM.readline()
     count = 1
     while line:
@@ -313,41 +412,38 @@ def loadTempTables ():
 
         if len(re.findall('[^0-9]',startCoordinate)) > 0:
             print('Invalid start coordinate (line ' + str(count) + ')')
-            fpGMBCP.close()
             closeFiles()
             sys.exit(1)
 
         if len(re.findall('[^0-9]',endCoordinate)) > 0:
             print('Invalid end coordinate (line ' + str(count) + ')')
-            fpGMBCP.close()
             closeFiles()
             sys.exit(1)
 
         if strand != '-' and strand != '+' and strand != '.':
             print('Invalid strand (line ' + str(count) + ')')
-            fpGMBCP.close()
             closeFiles()
             sys.exit(1)
 
-        fpGMBCP.write(gmID + TAB + chromosome + TAB +
-                      startCoordinate + TAB + endCoordinate + TAB +
-                      strand + TAB + description + NL)
+        gmData.write(gmID + TAB + chromosome + TAB +
+                     startCoordinate + TAB + endCoordinate + TAB +
+                     strand + TAB + description + NL)
 
         line = fpGM.readline()
         count += 1
 
-    #
-    # Close the bcp file.
-    #
-    fpGMBCP.close()
+    logElapsed('Validate the gene model input file', startTime)
 
-    print('Create a bcp file from the association input file')
+    print('Validate the association input file')
     sys.stdout.flush()
 
+    startTime = time.time()
+
     #
     # Read each record from the association input file, perform validation
-    # checks and write them to a bcp file.
+    # checks and add them to the data to be copied into the temp table.
     #
+    assocData = io.StringIO()
     line = fpAssoc.readline()
     count = 1
     while line:
@@ -357,11 +453,10 @@ def loadTempTables ():
 
         if re.match('MGI:[0-9]+',mgiID) == None:
             print('Invalid MGI ID (line ' + str(count) + ')')
-            fpAssocBCP.close()
             closeFiles()
             sys.exit(1)
 
-        fpAssocBCP.write(mgiID + TAB + gmID + NL)
+        assocData.write(mgiID + TAB + gmID + NL)
 
         #
         # Maintain a dictionary of the MGI IDs that are in the association
@@ -379,35 +474,53 @@ def loadTempTables ():
         line = fpAssoc.readline()
         count += 1
 
-    #
-    # Close the bcp file.
-    #
-    fpAssocBCP.close()
+    logElapsed('Validate the association input file', startTime)
 
     #
-    # Load the temp tables with the input data.
+    # Load the temp tables with the input data. The two loads are
+    # independent of each other, so the association data is copied on a
+    # second connection while the gene model data is copied in the session.
     #
     print('Load the gene model data into the temp table: ' + gmTempTable)
+    print('Load the association data into the temp table: ' + assocTempTable)
     sys.stdout.flush()
 
-    bcpCmd = '%s %s %s %s "/" %s "\\t" "\\n" mgd' % \
-        (bcpCommand, db.get_sqlServer(), db.get_sqlDatabase(),gmTempTable, gmBCPFile)
+    startTime = time.time()
+    gmData.seek(0)
+    assocData.seek(0)
+    assocResult = {}
+    assocLoad = threading.Thread(target = copyInConnection,
+                                 args = (assocTempTable, assocData, assocResult))
+    assocLoad.start()
+    try:
+        rows = genemodeldb.copyIn(gmTempTable, gmData)
+        genemodeldb.commit()
+        logElapsed('Load %d rows into %s' % (rows, gmTempTable), startTime)
+    finally:
+        assocLoad.join()
 
-    rc = os.system(bcpCmd)
-    if rc != 0:
-        closeFiles()
-        sys.exit(1)
+    if 'error' in assocResult:
+        raise assocResult['error']
+    logElapsed('Load %d rows into %s' % (assocResult['rows'], assocTempTable), startTime)
 
-    print('Load the association data into the temp table: ' + assocTempTable)
+    #
+    # Build the indexes once the data is in and refresh the planner
+    # statistics for the QC report queries.
+    #
+    print('Index the temp tables')
     sys.stdout.flush()
 
-    bcpCmd = '%s %s %s %s "/" %s "\\t" "\\n" mgd' % \
-        (bcpCommand, db.get_sqlServer(), db.get_sqlDatabase(),assocTempTable, assocBCPFile)
+    startTime = time.time()
+    genemodeldb.sql('create index idx_gmID on %s (gmID)' % (gmTempTable), None)
+    genemodeldb.sql('create index idx_chromosome on %s (chromosome)' % (gmTempTable), None)
+    genemodeldb.sql('create index idx_assoc_mgiID on %s (mgiID)' % (assocTempTable), None)
+    genemodeldb.sql('create index idx_assoc_gmID on %s (gmID)' % (assocTempTable), None)
+    logElapsed('Index the temp tables', startTime)
 
-    rc = os.system(bcpCmd)
-    if rc != 0:
-        closeFiles()
-        sys.exit(1)
+    startTime = time.time()
+    genemodeldb.sql('analyze %s' % (gmTempTable), None)
+    genemodeldb.sql('analyze %s' % (assocTempTable), None)
+    logElapsed('Analyze the temp tables', startTime)
 
     return
 
@@ -481,7 +594,7 @@ def createInvMarkerReport ():
                 ) 
                 order by mgiID, gmID''' % (assocTempTable, assocTempTable, assocTempTable)
 
-    results = db.sql(cmds,'auto')
+    results = genemodeldb.sql(cmds,'auto')
 
     #
     # Write the records to the report.
@@ -569,7 +682,7 @@ def createSecMarkerReport ():
                 order by tmp.mgiID, tmp.gmID
                 ''' % (assocTempTable)
 
-    results = db.sql(cmds,'auto')
+    results = genemodeldb.sql(cmds,'auto')
     #
     # Write the records to the report.
     #
@@ -629,7 +742,7 @@ def createMissingGMIDReport ():
                 order by ta.gmID
                 ''' % (assocTempTable, gmTempTable)
 
-    results = db.sql(cmds,'auto')
+    results = genemodeldb.sql(cmds,'auto')
 
     #
     # Write the records to the report.
@@ -702,7 +815,7 @@ def createChrDiscrepReport ():
                 order by tgm.gmID
                 ''' % (gmTempTable, assocTempTable)
 
-    results = db.sql(cmds,'auto')
+    results = genemodeldb.sql(cmds,'auto')
 
     #
     # Write the records to the report.
@@ -797,13 +910,13 @@ def createDupGMIDReport ():
                 group by tgm.gmID
                 having count(*) > 1''' % gmTempTable
 
-    db.sql(cmd, None)
+    genemodeldb.sql(cmd, None)
 
     cmd = '''select tgm.gmID, tgm.chromosome
                 from  %s tgm, dupes d
                 where lower(tgm.gmID) = lower(d.gmID)''' % gmTempTable
 
-    results = db.sql(cmd, 'auto')
+    results = genemodeldb.sql(cmd, 'auto')
 
     # Add all the dupes to the dictionary
     dupeDict = {}
@@ -879,13 +992,18 @@ def createAssocLoadFile ():
 #
 checkArgs()
 openFiles()
-loadTempTables()
-createInvMarkerReport()
-createSecMarkerReport()
-createMissingGMIDReport()
-createChrDiscrepReport()
-createDupGMIDReport()
-closeFiles()
+try:
+    createTempTables()
+    loadTempTables()
+    createInvMarkerReport()
+    createSecMarkerReport()
+    createMissingGMIDReport()
+    createChrDiscrepReport()
+    createDupGMIDReport()
+    closeFiles()
+finally:
+    dropTempTables()
+    genemodeldb.close()
 
 if liveRun == "1":
     createAssocLoadFile()
@@ -73,10 +73,10 @@
 #      5) Initialize the report files.
 #      6) Clean up the input files by removing blank lines, Ctrl-M, etc.
 #      7) Generate the sanity reports.
-#      8) Create temp tables for the input data.
-#      9) Load the input files into temp tables.
-#      10) Call genemodelQC.py to generate the QC reports.
-#      11) Drop the temp tables.
+#      8) Call genemodelQC.py to load the input files into temp tables and
+#         generate the QC reports. genemodelQC.py creates and drops the
+#         temp tables itself; the two tables are loaded at the same time
+#         on separate database connections.
 #
 #  Notes:  None
 #
@@ -465,42 +465,6 @@ then
     exit 1
 fi
 
-#
-# Create temp tables for the input data.
-#
-echo "" >> ${LOG}
-date >> ${LOG}
-echo "Create temp tables for the input data" >> ${LOG}
-cat - <<EOSQL | psql -h${MGD_DBSERVER} -d${MGD_DBNAME} -U${MGD_DBUSER} -e  >> ${LOG}
-
-create table ${GM_TEMP_TABLE} (
-    gmID text not null,
-    chromosome varchar(8) not null,
-    startCoordinate float not null,
-    endCoordinate float not null,
-    strand char(1) not null,
-    description text not null
-);
-
-create  index idx_gmID on ${GM_TEMP_TABLE} (gmID);
-
-create  index idx_chromosome on ${GM_TEMP_TABLE} (chromosome);
-
-grant all on ${GM_TEMP_TABLE} to public;
-
-create table ${ASSOC_TEMP_TABLE} (
-    mgiID text not null,
-    gmID text not null
-);
-
-create  index idx_assoc_mgiID on ${ASSOC_TEMP_TABLE} (mgiID);
-
-create  index idx_assoc_gmID on ${ASSOC_TEMP_TABLE} (gmID);
-
-grant all on ${ASSOC_TEMP_TABLE} to public;
-
-EOSQL
-
 #
 # Generate the QC reports.
 #
@@ -523,27 +487,8 @@ else
     RC=0
 fi
 
-#
-# Drop the temp tables.
-#
-echo "" >> ${LOG}
-date >> ${LOG}
-echo "Drop the temp tables" >> ${LOG}
-cat - <<EOSQL | psql -h${MGD_DBSERVER} -d${MGD_DBNAME} -U${MGD_DBUSER} -e  >> ${LOG}
-
-drop table ${GM_TEMP_TABLE};
-
-drop table ${ASSOC_TEMP_TABLE};
-
-EOSQL
-
 date >> ${LOG}
 
-#
-# Remove the bcp files.
-#
-rm -f ${GM_FILE_BCP} ${ASSOC_FILE_BCP}
-
 #
 # Remove the QC-ready association file.
 #
@@ -0,0 +1,381 @@
+###########################################################################
+#
+#  genemodeldb.py
+#
+#  Purpose:
+#
+#      Provides one database session that a gene model script can use for
+#      all of its work (table creation, loading, reporting and cleanup)
+#      instead of shelling out to psql and bcpin.csh for each step.
+#
+#      bulkLoad() is the shared loader for the scripts that replace the
+#      contents of a table: the delete and the COPY are one transaction.
+#      swapLoad() does the same through a checked staging table, for
+#      small tables that are read while they are reloaded.
+#
+#      sql() follows the same calling conventions as db.sql(), so the
+#      results can be used the same way (case-insensitive column names).
+#
+#  Env Vars:
+#
+#      MGD_DBSERVER
+#      MGD_DBNAME
+#      MGD_DBUSER
+#      MGD_DBPASSWORDFILE
+#
+#      The password is read from MGD_DBPASSWORDFILE, the same way db does,
+#      so a script that uses both modules logs in the same way twice. If
+#      the file is not set or cannot be read (e.g. a curator running the
+#      QC), libpq resolves the password (PGPASSFILE or ~/.pgpass), as it
+#      does for psql.
+#
+#  Notes:  None
+#
+###########################################################################
+
+import os
+import sys
+import time
+import psycopg2
+
+#
+#  GLOBALS
+#
+connection = None
+commandLog = None	# file descriptor that each SQL command is written to
+
+
+#
+# Purpose: Raised when a bulk load does not load the expected rows.
+#
+class Error (Exception):
+    pass
+
+
+#
+# Purpose: Result row that allows case-insensitive column lookups, like
+#          the rows returned by db.sql().
+#
+class Row (dict):
+
+    def __init__ (self, pairs):
+        dict.__init__(self, [(k.lower(), v) for k, v in pairs])
+
+    def __getitem__ (self, key):
+        return dict.__getitem__(self, key.lower())
+
+    def __setitem__ (self, key, value):
+        dict.__setitem__(self, key.lower(), value)
+
+    def __contains__ (self, key):
+        return dict.__contains__(self, key.lower())
+
+    def get (self, key, default = None):
+        return dict.get(self, key.lower(), default)
+
+
+#
+# Purpose: Open a new connection to the database, using the password in
+#          MGD_DBPASSWORDFILE, or libpq's own password lookup if that
+#          file cannot be read.
+# Returns: The connection
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: psycopg2.Error if the connection cannot be made
+#
+def openConnection ():
+    params = {'host' : os.environ['MGD_DBSERVER'],
+              'dbname' : os.environ['MGD_DBNAME'],
+              'user' : os.environ['MGD_DBUSER']}
+
+    try:
+        fp = open(os.environ['MGD_DBPASSWORDFILE'], 'r')
+        params['password'] = fp.readline().strip()
+        fp.close()
+    except (KeyError, IOError):
+        pass
+
+    return psycopg2.connect(**params)
+
+
+#
+# Purpose: Open the database session (if it is not already open).
+# Returns: The connection
+# Assumes: Nothing
+# Effects: Sets global variables.
+# Throws: psycopg2.Error if the connection cannot be made
+#
+def connect ():
+    global connection
+
+    if connection is None:
+        connection = openConnection()
+    return connection
+
+
+#
+# Purpose: Write each SQL command run in the session to a log file, as
+#          db.set_commandLogFile() does.
+# Returns: Nothing
+# Assumes: fp is open for writing
+# Effects: Sets global variables.
+# Throws: Nothing
+#
+def setCommandLog (fp):
+    global commandLog
+
+    commandLog = fp
+    return
+
+
+#
+# Purpose: Write a SQL command to the command log (if any).
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Writes to the command log.
+# Throws: Nothing
+#
+def logCommand (cmd):
+    if commandLog is not None:
+        commandLog.write('%s\n' % (cmd))
+        commandLog.flush()
+    return
+
+
+#
+# Purpose: Execute a SQL command in the session.
+# Returns: A list of Row objects if parser is 'auto', otherwise None
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: psycopg2.Error if the command fails
+#
+def sql (cmd, parser = 'auto'):
+    logCommand(cmd)
+    cursor = connect().cursor()
+    try:
+        cursor.execute(cmd)
+        if parser != 'auto' or cursor.description is None:
+            return None
+        columns = [d[0] for d in cursor.description]
+        return [Row(zip(columns, r)) for r in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+#
+# Purpose: Load a tab-delimited stream into a table with COPY, in the
+#          session or on the given connection (see openConnection()).
+# Returns: The number of rows loaded
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: psycopg2.Error if the load fails
+#
+def copyIn (table, fp, columns = None, sep = '\t', conn = None):
+    if columns:
+        table = '%s (%s)' % (table, ', '.join(columns))
+    cmd = "copy %s from stdin with (format text, delimiter E'%s', null '')" % \
+        (table, sep.replace('\t', '\\t'))
+
+    logCommand(cmd)
+    if conn is None:
+        conn = connect()
+    cursor = conn.cursor()
+    try:
+        cursor.copy_expert(cmd, fp)
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+#
+# Purpose: File-like wrapper that feeds an iterable of row tuples to COPY
+#          as tab-delimited text, one row at a time.
+#
+class RowReader:
+
+    def __init__ (self, rows, sep = '\t'):
+        self.rows = iter(rows)
+        self.sep = sep
+        self.buffer = ''
+        self.count = 0
+
+    def formatRow (self, row):
+        values = []
+        for value in row:
+            if value is None:
+                values.append('')
+            else:
+                values.append(str(value).replace('\\', '\\\\').replace(
+                    '\t', '\\t').replace('\n', '\\n').replace('\r', '\\r'))
+        self.count += 1
+        return self.sep.join(values) + '\n'
+
+    def read (self, size = -1):
+        chunks = [self.buffer]
+        length = len(self.buffer)
+        self.buffer = ''
+        for row in self.rows:
+            line = self.formatRow(row)
+            chunks.append(line)
+            length += len(line)
+            if size > 0 and length >= size:
+                break
+        data = ''.join(chunks)
+        if size > 0 and len(data) > size:
+            data, self.buffer = data[:size], data[size:]
+        return data
+
+
+#
+# Purpose: Load an iterable of row tuples into a table with COPY.
+# Returns: The number of rows loaded
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: psycopg2.Error if the load fails
+#
+def copyRows (table, rows, columns = None):
+    return copyIn(table, RowReader(rows), columns)
+
+
+#
+# Purpose: Replace the contents of a table in one transaction: run the
+#          delete command (if any), stream the rows in with COPY and
+#          verify that every row was loaded. Nothing is committed unless
+#          the whole load succeeds.
+# Returns: The number of rows loaded
+# Assumes: Nothing
+# Effects: Writes the load rate to stdout.
+# Throws: Error if fewer than minRows rows, or not all rows, are loaded;
+#         psycopg2.Error if a command fails
+#
+def bulkLoad (table, rows, columns = None, deleteCmd = None, minRows = 1):
+    startTime = time.time()
+    reader = RowReader(rows)
+
+    try:
+        if deleteCmd:
+            sql(deleteCmd, None)
+        loaded = copyIn(table, reader, columns)
+        if loaded != reader.count:
+            raise Error('%s: %d rows sent, %d rows loaded' % (table, reader.count, loaded))
+        if loaded < minRows:
+            raise Error('%s: %d rows loaded, expecting at least %d' % (table, loaded, minRows))
+        commit()
+    except:
+        rollback()
+        raise
+
+    elapsed = time.time() - startTime
+    print('%s: %d rows loaded in %.2f seconds (%d rows/sec)' % \
+        (table, loaded, elapsed, loaded / max(elapsed, 0.001)))
+    sys.stdout.flush()
+    return loaded
+
+
+#
+# Purpose: Replace the contents of a table through a staging table: the
+#          rows are streamed with COPY into a temporary copy of the table
+#          and checked (row count, unique non-null keyColumn) before the
+#          live table is touched. The swap itself (delete, and insert from
+#          the staging table) is one transaction, so readers see either
+#          the old rows or the new rows. preCmds and postCmds are run in
+#          the same transaction, before the delete and after the insert.
+#          If any step fails, the live table is left as it was.
+#
+#          The swap is a delete of every live row and an insert of every
+#          staged row, not a rename, so that the grants, indexes and
+#          foreign keys of the live table are kept: its lock time and WAL
+#          grow with the size of the table. That is fine for small tables
+#          such as MRK_BiotypeMapping; it is not meant for large ones.
+# Returns: The number of rows loaded
+# Assumes: Nothing
+# Effects: Writes the load and swap times to stdout.
+# Throws: Error if the staged rows fail a check; psycopg2.Error if a
+#         command fails
+#
+def swapLoad (table, rows, columns = None, keyColumn = None, minRows = 1,
+              preCmds = None, postCmds = None):
+    startTime = time.time()
+    reader = RowReader(rows)
+    staging = '%s_staging' % (table)
+
+    try:
+        sql('drop table if exists %s' % (staging), None)
+        sql('create temporary table %s (like %s including defaults)' % (staging, table), None)
+        loaded = copyIn(staging, reader, columns)
+        commit()
+
+        if loaded != reader.count:
+            raise Error('%s: %d rows sent, %d rows staged' % (table, reader.count, loaded))
+        if loaded < minRows:
+            raise Error('%s: %d rows staged, expecting at least %d' % (table, loaded, minRows))
+        if keyColumn:
+            results = sql('select count(distinct %s) as keys from %s' % (keyColumn, staging))
+            if results[0]['keys'] != loaded:
+                raise Error('%s: %d rows staged, but only %d distinct non-null %s values' % \
+                    (table, loaded, results[0]['keys'], keyColumn))
+
+        stageTime = time.time()
+        for cmd in preCmds or []:
+            sql(cmd, None)
+        sql('delete from %s' % (table), None)
+        sql('insert into %s select * from %s' % (table, staging), None)
+        for cmd in postCmds or []:
+            sql(cmd, None)
+        commit()
+    except:
+        rollback()
+        sql('drop table if exists %s' % (staging), None)
+        commit()
+        raise
+
+    endTime = time.time()
+    sql('drop table %s' % (staging), None)
+    commit()
+
+    print('%s: %d rows staged in %.2f seconds, swapped in %.2f seconds' % \
+        (table, loaded, stageTime - startTime, endTime - stageTime))
+    sys.stdout.flush()
+    return loaded
+
+
+#
+# Purpose: Commit the current transaction.
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def commit ():
+    if connection is not None:
+        connection.commit()
+    return
+
+
+#
+# Purpose: Roll back the current transaction.
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def rollback ():
+    if connection is not None:
+        connection.rollback()
+    return
+
+
+#
+# Purpose: Close the database session.
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Sets global variables.
+# Throws: Nothing
+#
+def close ():
+    global connection
+
+    if connection is not None:
+        connection.close()
+        connection = None
+    return
@@ -0,0 +1,353 @@
+###########################################################################
+#
+#  gffgzip.py
+#
+#  Purpose:
+#
+#      Writes a gzipped text file (the published MGIreg.gff3.gz) with its
+#      blocks compressed in parallel.
+#
+#      The text is cut into blocks of blockSize bytes; each block is
+#      compressed as a separate gzip member on a thread pool (zlib
+#      releases the GIL while it compresses) and the members are written
+#      in order. A file of several members is a standard gzip stream:
+#      gzip, zcat and the Python gzip module read it as one file.
+#
+#      BGZFWriter writes the same text coordinate-sorted, as BGZF (the
+#      blocked gzip of samtools/tabix: gzip members of at most 64KB, each
+#      recording its own size, still read as one file by any gzip
+#      reader), with a tabix index (<fileName>.tbi) of the sequence,
+#      start and end columns, so that a region can be read without
+#      decompressing the whole file.
+#
+#      The files are written as <fileName>.new and renamed when they are
+#      closed, so a failed run does not leave a partial file.
+#
+#  Notes:  None
+#
+###########################################################################
+
+import os
+import zlib
+import struct
+import collections
+import concurrent.futures
+
+#
+# CONSTANTS
+#
+DEFAULT_LEVEL = 9
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+# zlib window bits for a gzip header and trailer
+GZIP_WBITS = 31
+
+# BGZF: uncompressed bytes per block (as htslib), block header (gzip
+# header with the BC extra field holding the block size - 1) and the
+# empty block that ends the file
+BGZF_BLOCK_SIZE = 0xff00
+BGZF_MAX_BLOCK = 0x10000
+BGZF_HEADER = struct.Struct('<4BI2BH2BHH')
+BGZF_TRAILER = struct.Struct('<II')
+BGZF_EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+# tabix: generic format, minimum 16KB linear index window, pseudo-bin
+# holding the offsets and counts of each sequence
+TBI_MAGIC = b'TBI\x01'
+TBI_GENERIC = 0
+TBI_LINEAR_SHIFT = 14
+TBI_META_BIN = 37450
+
+
+#
+# Purpose: Raised when a line to be indexed has no valid coordinates.
+#
+class Error (Exception):
+    pass
+
+
+#
+# Purpose: Compress one block as a gzip member.
+# Returns: The member (bytes)
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def compressBlock (data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+#
+# Purpose: Text file writer that gzips its output in parallel blocks.
+#
+class GzipWriter:
+
+    def __init__ (self, fileName, level = DEFAULT_LEVEL, threads = None,
+                  blockSize = DEFAULT_BLOCK_SIZE, encoding = 'utf-8'):
+        self.fileName = fileName
+        self.level = level
+        self.threads = threads or os.cpu_count() or 1
+        self.blockSize = blockSize
+        self.encoding = encoding
+
+        self.fp = open(fileName + '.new', 'wb')
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.threads)
+
+        # text not yet sent to be compressed, and its size
+        self.text = []
+        self.size = 0
+
+        # blocks being compressed, in file order
+        self.members = collections.deque()
+        self.blockCount = 0
+
+    def write (self, text):
+        self.text.append(text)
+        self.size += len(text)
+        if self.size >= self.blockSize:
+            self.submit()
+
+    #
+    # send the text held so far to be compressed; write the members that
+    # are done, so that no more than two per thread are held
+    #
+    def submit (self):
+        data = ''.join(self.text).encode(self.encoding)
+        self.text = []
+        self.size = 0
+
+        self.members.append(self.executor.submit(compressBlock, data, self.level))
+        self.blockCount += 1
+        while len(self.members) > 2 * self.threads:
+            self.fp.write(self.members.popleft().result())
+
+    def close (self):
+        try:
+            # an empty file is still one (empty) member
+            if self.size > 0 or self.blockCount == 0:
+                self.submit()
+            while self.members:
+                self.fp.write(self.members.popleft().result())
+        finally:
+            self.executor.shutdown()
+            self.fp.close()
+        os.replace(self.fileName + '.new', self.fileName)
+
+
+#
+# Purpose: Compress one block as a BGZF block.
+# Returns: The block (bytes)
+# Assumes: len(data) <= BGZF_BLOCK_SIZE
+# Effects: Nothing
+# Throws: Nothing
+#
+def bgzfBlock (data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+
+    # data that does not compress is stored
+    if len(cdata) + BGZF_HEADER.size + BGZF_TRAILER.size > BGZF_MAX_BLOCK:
+        compressor = zlib.compressobj(0, zlib.DEFLATED, -15)
+        cdata = compressor.compress(data) + compressor.flush()
+
+    blockSize = BGZF_HEADER.size + len(cdata) + BGZF_TRAILER.size
+    return BGZF_HEADER.pack(31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, blockSize - 1) + \
+        cdata + BGZF_TRAILER.pack(zlib.crc32(data), len(data))
+
+
+#
+# Purpose: Get the tabix/BAI bin of a region (0-based, end exclusive).
+# Returns: The bin number
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: Nothing
+#
+def reg2bin (beg, end):
+    end -= 1
+    if beg >> 14 == end >> 14:
+        return 4681 + (beg >> 14)
+    if beg >> 17 == end >> 17:
+        return 585 + (beg >> 17)
+    if beg >> 20 == end >> 20:
+        return 73 + (beg >> 20)
+    if beg >> 23 == end >> 23:
+        return 9 + (beg >> 23)
+    if beg >> 26 == end >> 26:
+        return 1 + (beg >> 26)
+    return 0
+
+
+#
+# Purpose: Text file writer that sorts the lines by sequence and start,
+#          writes them as BGZF and indexes them with tabix. The lines are
+#          held until close(); lines that start with meta are written
+#          first, as they were given, and are not indexed.
+#          Columns are numbered from 1, as in tabix.
+#
+class BGZFWriter:
+
+    def __init__ (self, fileName, level = DEFAULT_LEVEL, threads = None,
+                  seqColumn = 1, begColumn = 4, endColumn = 5, meta = '#',
+                  encoding = 'utf-8'):
+        self.fileName = fileName
+        self.level = level
+        self.threads = threads or os.cpu_count() or 1
+        self.seqColumn = seqColumn
+        self.begColumn = begColumn
+        self.endColumn = endColumn
+        self.meta = meta
+        self.encoding = encoding
+        self.text = []
+
+    def write (self, text):
+        self.text.append(text)
+
+    def close (self):
+        headerLines, refs, records = self.sortLines()
+        self.text = []
+
+        # the uncompressed file, and the offset of each record in it
+        data = []
+        offsets = []
+        pos = 0
+        for line in headerLines:
+            line = line.encode(self.encoding)
+            data.append(line)
+            pos += len(line)
+        for r in records:
+            line = r[4].encode(self.encoding)
+            offsets.append((pos, pos + len(line)))
+            data.append(line)
+            pos += len(line)
+        data = b''.join(data)
+
+        # compress the blocks in parallel; blockOffsets[i] is the file
+        # offset of block i (and of the EOF block, after the last one)
+        executor = concurrent.futures.ThreadPoolExecutor(self.threads)
+        try:
+            blocks = list(executor.map(bgzfBlock,
+                [data[i:i + BGZF_BLOCK_SIZE] for i in range(0, len(data), BGZF_BLOCK_SIZE)],
+                [self.level] * ((len(data) + BGZF_BLOCK_SIZE - 1) // BGZF_BLOCK_SIZE)))
+        finally:
+            executor.shutdown()
+
+        blockOffsets = [0]
+        for block in blocks:
+            blockOffsets.append(blockOffsets[-1] + len(block))
+
+        fp = open(self.fileName + '.new', 'wb')
+        for block in blocks:
+            fp.write(block)
+        fp.write(BGZF_EOF)
+        fp.close()
+
+        def virtualOffset (pos):
+            return (blockOffsets[pos // BGZF_BLOCK_SIZE] << 16) | (pos % BGZF_BLOCK_SIZE)
+
+        index = self.buildIndex(refs, records,
+            [(virtualOffset(b), virtualOffset(e)) for b, e in offsets])
+        fp = open(self.fileName + '.tbi.new', 'wb')
+        for i in range(0, len(index), BGZF_BLOCK_SIZE):
+            fp.write(bgzfBlock(index[i:i + BGZF_BLOCK_SIZE], self.level))
+        fp.write(BGZF_EOF)
+        fp.close()
+
+        os.replace(self.fileName + '.new', self.fileName)
+        os.replace(self.fileName + '.tbi.new', self.fileName + '.tbi')
+
+    #
+    # split the text into header lines and records sorted by sequence
+    # (in order of first appearance) and start
+    # records: [(ref number, beg (0-based), end, line number, line), ...]
+    #
+    def sortLines (self):
+        headerLines = []
+        refs = []
+        refNumbers = {}
+        records = []
+
+        lines = ''.join(self.text).split('\n')
+        if lines[-1] == '':
+            lines.pop()
+        for i, line in enumerate(lines):
+            line = line + '\n'
+            if line.startswith(self.meta):
+                headerLines.append(line)
+                continue
+            columns = line[:-1].split('\t')
+            try:
+                seq = columns[self.seqColumn - 1]
+                beg = int(columns[self.begColumn - 1]) - 1
+                end = int(columns[self.endColumn - 1])
+            except (IndexError, ValueError):
+                raise Error('%s: line %d has no valid coordinates: %s' % (self.fileName, i + 1, line))
+            if end <= beg:
+                end = beg + 1
+            if seq not in refNumbers:
+                refNumbers[seq] = len(refs)
+                refs.append(seq)
+            records.append((refNumbers[seq], beg, end, i, line))
+
+        records.sort()
+        return headerLines, refs, records
+
+    #
+    # the tabix index (uncompressed) of the sorted records;
+    # voffsets[i] is the (begin, end) virtual offset of records[i]
+    #
+    def buildIndex (self, refs, records, voffsets):
+        names = b''.join([r.encode(self.encoding) + b'\0' for r in refs])
+        index = [TBI_MAGIC, struct.pack('<8i', len(refs), TBI_GENERIC,
+            self.seqColumn, self.begColumn, self.endColumn, ord(self.meta), 0, len(names)), names]
+
+        i = 0
+        for ref in range(len(refs)):
+            bins = collections.OrderedDict()
+            linear = []
+            refStart = i
+            currentBin = None
+
+            while i < len(records) and records[i][0] == ref:
+                beg, end = records[i][1], records[i][2]
+                vbeg, vend = voffsets[i]
+
+                # consecutive records in the same bin are one chunk, as are
+                # chunks of a bin that end and start in the same block
+                b = reg2bin(beg, end)
+                chunks = bins.setdefault(b, [])
+                if b == currentBin or (chunks and chunks[-1][1] >> 16 == vbeg >> 16):
+                    chunks[-1][1] = vend
+                else:
+                    chunks.append([vbeg, vend])
+                currentBin = b
+
+                # linear index: first record offset of each 16KB window
+                lastWindow = (end - 1) >> TBI_LINEAR_SHIFT
+                if len(linear) <= lastWindow:
+                    linear.extend([None] * (lastWindow + 1 - len(linear)))
+                for w in range(beg >> TBI_LINEAR_SHIFT, lastWindow + 1):
+                    if linear[w] is None:
+                        linear[w] = vbeg
+                i += 1
+
+            if i > refStart:
+                bins[TBI_META_BIN] = [[voffsets[refStart][0], voffsets[i - 1][1]], [i - refStart, 0]]
+
+            # windows with no record start where the next one does
+            nextOffset = voffsets[i - 1][1] if i > refStart else 0
+            for w in range(len(linear) - 1, -1, -1):
+                if linear[w] is None:
+                    linear[w] = nextOffset
+                nextOffset = linear[w]
+
+            index.append(struct.pack('<i', len(bins)))
+            for b, chunks in bins.items():
+                index.append(struct.pack('<Ii', b, len(chunks)))
+                for c in chunks:
+                    index.append(struct.pack('<QQ', c[0], c[1]))
+            index.append(struct.pack('<i', len(linear)))
+            index.append(struct.pack('<%dQ' % (len(linear)), *linear))
+
+        index.append(struct.pack('<Q', 0))
+        return b''.join(index)
@@ -0,0 +1,289 @@
+###########################################################################
+#
+#  gtfreader.py
+#
+#  Purpose:
+#
+#      Reads a provider GTF (or GFF3) file, plain or gzipped, and counts
+#      the transcripts and distinct exons of each gene in one pass, for
+#      the SEQ_GeneModel exonCount and transcriptCount columns.
+#
+#      Only the exon rows are parsed; the gene and transcript IDs are
+#      taken from the exon row's attributes with a pattern, so that the
+#      same code handles the Ensembl GTF (gene_id/transcript_id) and the
+#      NCBI files (GeneID db_xref):
+#
+#          geneIdPattern        - regex; group 1 is the gene model ID
+#          transcriptIdPattern  - regex; group 1 is the transcript ID
+#
+#      The rows of a gene are expected to be together (as they are in the
+#      provider files), so only the current gene's exons are held in
+#      memory.  If a gene's rows are split, the file is read a second time
+#      for the split genes only, and their exons and transcripts are
+#      merged and counted once.
+#
+#      grepLines() finds the lines that contain a token (the NCBI
+#      RefSeqFE features in MGIreg.gff3.py) at byte level.
+#
+#  Notes:  None
+#
+###########################################################################
+
+import gzip
+import io
+import mmap
+import os
+import re
+import shutil
+import subprocess
+
+#
+# CONSTANTS
+#
+TAB = '\t'
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# bytes read at a time from a gzipped file
+BLOCK_SIZE = 16 * 1024 * 1024
+
+# default patterns (Ensembl GTF)
+GENE_ID_PATTERN = r'gene_id "([^"]+)"'
+TRANSCRIPT_ID_PATTERN = r'transcript_id "([^"]+)"'
+
+
+#
+# Purpose: Open a text file for reading (or a binary file, if binary is
+#          set); gzipped files (by their magic number, not their name) are
+#          decompressed as they are read, by pigz in a separate process
+#          when it is installed.
+# Returns: The open file
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: IOError if the file cannot be opened
+#
+def openInput (fileName, encoding = None, binary = False):
+    fp = open(fileName, 'rb')
+    magic = fp.read(2)
+    fp.close()
+
+    if magic != GZIP_MAGIC:
+        if binary:
+            return open(fileName, 'rb')
+        return open(fileName, 'r', encoding = encoding)
+
+    pigz = shutil.which('pigz')
+    if pigz is None:
+        if binary:
+            return gzip.open(fileName, 'rb')
+        return gzip.open(fileName, 'rt', encoding = encoding)
+
+    fp = PipeInput(subprocess.Popen([pigz, '-dc', fileName],
+        stdout = subprocess.PIPE, bufsize = 0))
+    if binary:
+        return fp
+    return io.TextIOWrapper(fp, encoding = encoding)
+
+
+#
+# Purpose: Stream of a decompression process' output; close() waits for
+#          the process and fails if it did not exit cleanly.
+#
+class PipeInput (io.BufferedReader):
+
+    def __init__ (self, process):
+        io.BufferedReader.__init__(self, process.stdout, BLOCK_SIZE)
+        self.process = process
+
+    def close (self):
+        if self.closed:
+            return
+
+        # a reader that stops before the end does not need the rest
+        atEnd = self.peek(1) == b''
+        if not atEnd:
+            self.process.kill()
+
+        io.BufferedReader.close(self)
+        status = self.process.wait()
+        if atEnd and status != 0:
+            raise IOError('%s exited with status %d' % (' '.join(self.process.args), status))
+
+
+#
+# Purpose: Read the lines of a file that contain a token, without decoding
+#          or splitting the others: a plain file is memory-mapped, a
+#          gzipped one is decompressed in blocks, and bytes.find() jumps
+#          from one occurrence of the token to the next.
+# Returns: Generator of the matching lines (decoded, with their newline)
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: IOError if the file cannot be read
+#
+def grepLines (fileName, token, encoding = 'utf-8'):
+    token = token.encode(encoding)
+    fp = openInput(fileName, binary = True)
+
+    try:
+        if isinstance(fp, io.BufferedReader) and not isinstance(fp, PipeInput):
+            if os.fstat(fp.fileno()).st_size == 0:
+                return
+            data = mmap.mmap(fp.fileno(), 0, access = mmap.ACCESS_READ)
+            try:
+                for line in scanBlock(data, len(data), token):
+                    yield line.decode(encoding)
+            finally:
+                data.close()
+            return
+
+        # the partial last line of each block is carried to the next
+        rest = b''
+        while True:
+            block = fp.read(BLOCK_SIZE)
+            if not block:
+                break
+            block = rest + block
+            end = block.rfind(b'\n') + 1
+            for line in scanBlock(block, end, token):
+                yield line.decode(encoding)
+            rest = block[end:]
+        for line in scanBlock(rest, len(rest), token):
+            yield line.decode(encoding)
+    finally:
+        fp.close()
+
+
+#
+# Purpose: Find the lines in data[:end] that contain a token.
+# Returns: Generator of the matching lines (bytes)
+# Assumes: data[:end] ends at the end of a line, or of the file
+# Effects: Nothing
+# Throws: Nothing
+#
+def scanBlock (data, end, token):
+    pos = data.find(token, 0, end)
+    while pos >= 0:
+        start = data.rfind(b'\n', 0, pos) + 1
+        stop = data.find(b'\n', pos, end) + 1
+        if stop == 0:
+            stop = end
+        yield data[start:stop]
+        pos = data.find(token, stop, end)
+
+
+#
+# Purpose: Read the exon rows of a file.
+# Returns: Generator of (gmID, exon, transcriptID or None); the exon is
+#          (chromosome, start, end, strand)
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: IOError if the file cannot be read
+#
+def readExons (fileName, geneRE, transcriptRE):
+    fp = openInput(fileName)
+    try:
+        for line in fp:
+
+            # cheap test before the line is split
+            if '\texon\t' not in line or line[0] == '#':
+                continue
+
+            columns = line.split(TAB)
+            if columns[2] != 'exon':
+                continue
+
+            attributes = columns[8]
+            match = geneRE.search(attributes)
+            if match is None:
+                continue
+
+            transcript = transcriptRE.search(attributes)
+            if transcript is not None:
+                transcript = transcript.group(1)
+
+            yield (match.group(1), (columns[0], columns[3], columns[4], columns[6]), transcript)
+    finally:
+        fp.close()
+
+
+#
+# Purpose: Count the transcripts and distinct exons of each gene.
+# Returns: Dictionary {gmID : (exonCount, transcriptCount), ...}
+# Assumes: Nothing
+# Effects: Nothing
+# Throws: IOError if the file cannot be read
+#
+def countExons (fileName, geneIdPattern = None, transcriptIdPattern = None):
+    geneRE = re.compile(geneIdPattern or GENE_ID_PATTERN)
+    transcriptRE = re.compile(transcriptIdPattern or TRANSCRIPT_ID_PATTERN)
+
+    countsByGene = {}
+
+    # genes whose rows are not together
+    splitGenes = set()
+
+    # the gene being read, and its exons and transcripts so far
+    currentGene = None
+    exons = set()
+    transcripts = set()
+
+    for gene, exon, transcript in readExons(fileName, geneRE, transcriptRE):
+        if gene != currentGene:
+            addCounts(countsByGene, currentGene, exons, transcripts)
+            if gene in countsByGene:
+                splitGenes.add(gene)
+            currentGene = gene
+            exons = set()
+            transcripts = set()
+
+        exons.add(exon)
+        if transcript is not None:
+            transcripts.add(transcript)
+
+    addCounts(countsByGene, currentGene, exons, transcripts)
+
+    if splitGenes:
+        countSplitGenes(countsByGene, splitGenes, fileName, geneRE, transcriptRE)
+
+    return countsByGene
+
+
+#
+# Purpose: Count the exons and transcripts of the genes whose rows are
+#          split, over all of their rows.
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Updates countsByGene
+# Throws: IOError if the file cannot be read
+#
+def countSplitGenes (countsByGene, splitGenes, fileName, geneRE, transcriptRE):
+    exonsByGene = {}
+    transcriptsByGene = {}
+    for gene in splitGenes:
+        exonsByGene[gene] = set()
+        transcriptsByGene[gene] = set()
+
+    for gene, exon, transcript in readExons(fileName, geneRE, transcriptRE):
+        if gene in splitGenes:
+            exonsByGene[gene].add(exon)
+            if transcript is not None:
+                transcriptsByGene[gene].add(transcript)
+
+    for gene in splitGenes:
+        addCounts(countsByGene, gene, exonsByGene[gene], transcriptsByGene[gene])
+    return
+
+
+#
+# Purpose: Set a gene's exon and transcript counts in the results.
+# Returns: Nothing
+# Assumes: Nothing
+# Effects: Updates countsByGene
+# Throws: Nothing
+#
+def addCounts (countsByGene, gene, exons, transcripts):
+    if gene is None:
+        return
+
+    countsByGene[gene] = (len(exons), len(transcripts))
+    return
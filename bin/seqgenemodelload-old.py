@@ -3,7 +3,7 @@
 # Purpose:
 #       creates bcp file for SEQ_GeneModel for a given provider
 #
-Usage='createSeqGeneModelInput.py provider (ensembl | ncbi | vistareg)'
+Usage='seqgenemodelload-old.py provider (ensembl | ncbi | vistareg) inputFile'
 #
 # Env Vars:
 #        1. BCP_FILE_PATH
@@ -12,7 +12,7 @@ Usage='createSeqGeneModelInput.py provider (ensembl | ncbi | vistareg)'
 # Inputs: 
 #	1. mgd database to resolve gmId to sequence key and
 #	      translate raw biotype to _MarkerType_key 
-#       2. provider file, from stdin, mapping gmId to raw biotype
+#       2. provider file (plain or gzipped), mapping gmId to raw biotype
 #
 # Outputs:
 #	 1. SEQ_GeneModel bcp file, tab-delimited
@@ -54,6 +54,7 @@ import sys
 import os
 import mgi_utils
 import db
+import biotypereader
 
 db.setTrace()
 
@@ -78,8 +79,10 @@ CREATEDBY_KEY = os.environ['USERKEY']
 # bcp file path
 bcpFilePath = ''
 
-# file descriptors
+# input file name
 inFile = ''
+
+# file descriptors
 bcpFile = ''
 
 # timestamp for creation/modification date
@@ -151,73 +154,26 @@ def loadSequenceKeyLookup():
         seqKeyByGMIDLookup[r['accId']].append(r['seqKey'])
     #print(seqKeyByGMIDLookup)
 
-# Purpose:  Load lookup of raw biotype by gene model ID for
-#	    either Ensembl (file format the same)
+# Purpose:  Load lookup of raw biotype by gene model ID from the
+#           provider file (Ensembl GTF or NCBI gene_info, detected
+#           by biotypereader)
 # Returns: nothing
-# Assumes: inFile is a valid file descriptor
-# Effects: nothing
-# Throws: nothing
-
-def loadEnsemblRawBioTypeByGMIDLookup():
-    global rawBioTypeByGMIDLookup
-
-    print('loadEnsemblRawBioTypeByGMIDLookup()')
-
-    for line in inFile.readlines():
-        #print('biotype file line: %s' % line)
-        columnList = str.split(line, TAB)
-
-        #
-        # if header, skip it
-        #
-        if columnList[0].find('#') == 0:
-            print('skipping header...%s' % (columnList))
-            continue
-
-        attributeList = str.split(columnList[8], SCOLON)
-        gmId = (str.split(attributeList[0], '"'))[1].strip()
-
-        biotype = ''
-
-        for a in attributeList:
-            #print('a: %s' % a)
-            if str.strip(a).startswith('gene_biotype'):
-                biotype = a.split('"')[1]
-                #print('biotype: %s' % biotype)
-        # there are redundant id/biotype lines in the input, all IDs have the
-        # same biotype for each of the redundant lines so save only one pair
-        # but just in case check
-        if gmId in rawBioTypeByGMIDLookup:
-            b = rawBioTypeByGMIDLookup[gmId]
-            if b != biotype:
-                print('Differing biotypes for %s: %s and %s' % (gmId, b, biotype))
-                continue
-        rawBioTypeByGMIDLookup[gmId] = biotype
-
-# Purpose:  Load lookup of raw biotype by gene model ID for
-#           either NCBI
-# Returns: nothing
-# Assumes: inFile is a valid file descriptor
+# Assumes: nothing
 # Effects: nothing
 # Throws: nothing
 
-def loadNCBIRawBioTypeByGMIDLookup():
+def loadRawBioTypeByGMIDLookup():
     global rawBioTypeByGMIDLookup
 
-    print('loadNCBIRawBioTypeByGMIDLookup()')
+    print('loadRawBioTypeByGMIDLookup()')
 
-    # get the header
-    header = inFile.readline()
+    # there are redundant id/biotype lines in the input, all IDs have the
+    # same biotype for each of the redundant lines so save only one pair
+    # but just in case check
+    rawBioTypeByGMIDLookup, conflicts = biotypereader.loadBiotypes(inFile)
+    for gmId, b, biotype in conflicts:
+        print('Differing biotypes for %s: %s and %s' % (gmId, b, biotype))
 
-    for line in inFile.readlines():
-        columnList =  str.split(line, TAB)
-        taxid = columnList[0]
-        if str.strip(taxid) == '10090':
-            gmId = columnList[1]
-            biotype = columnList[9]
-            rawBioTypeByGMIDLookup[gmId] = biotype
-            if gmId == '654820' or gmId == '170942':
-                print('line: %s' % line)
 # Purpose: Initialize globals; load lookups 
 # Returns: nothing
 # Assumes: nothing
@@ -230,12 +186,12 @@ def init():
     print('%s' % mgi_utils.date())
     print('Initializing')
 
-    inFile = sys.stdin
-    if len(sys.argv) != 2:
+    if len(sys.argv) != 3:
             print(Usage)
             sys.exit(1)
 
     provider = sys.argv[1]
+    inFile = sys.argv[2]
     try:
         bcpFilePath = os.environ['BCP_FILE_PATH']
         bcpFile = open(bcpFilePath, 'w')
@@ -243,11 +199,8 @@ def init():
         'Could not open file for writing %s\n' % bcpFilePath
         sys.exit(1)
 
-    if provider in ('ensembl', 'vistareg'):
-        loadEnsemblRawBioTypeByGMIDLookup()
-
-    elif provider == 'ncbi':
-        loadNCBIRawBioTypeByGMIDLookup()
+    if provider in ('ensembl', 'vistareg', 'ncbi'):
+        loadRawBioTypeByGMIDLookup()
 
     else:
         print('Provider not recognized: %s' % provider)
@@ -306,5 +259,4 @@ def run ():
 
 init()
 run()
-inFile.close()
 bcpFile.close()
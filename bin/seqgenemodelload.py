@@ -1,33 +1,60 @@
 ##########################################################################
 #
 # Purpose:
-#       creates bcp file for SEQ_GeneModel for a given provider
+#       loads SEQ_GeneModel for a given provider, or for several providers
+#	in one run (see -m below)
 #
-Usage='createSeqGeneModelInput.py inputFile (GM_FILE_DEFAULT)'
+Usage='seqgenemodelload.py inputFile (GM_FILE_DEFAULT) | -m providerManifest'
+#
+#	-m providerManifest : tab-delimited file, one line per provider:
+#	    provider, GM_FILE_DEFAULT, PROVIDER_LOGICALDB, USERKEY,
+#	    GM_GTF_FILE, GM_GTF_GENE_PATTERN, GM_GTF_TRANSCRIPT_PATTERN
+#	    (written by seqgenemodelload.sh). The biotype translation and the
+#	    sequence keys of all the providers are loaded once, and the
+#	    per-provider rows are built in parallel worker processes.
 #
 # Env Vars:
-#    1. BCP_FILE_PATH
-#	 2. PROVIDER_LOGICALDB
-#	 3. USERKEY
+#	 1. PROVIDER_LOGICALDB (single provider only)
+#	 2. USERKEY (single provider only)
+#	 3. GM_GTF_FILE, GM_GTF_GENE_PATTERN, GM_GTF_TRANSCRIPT_PATTERN
+#	    (single provider only, optional) - the provider GTF/GFF file
+#	    (plain or gzipped) and the patterns for its gene and transcript
+#	    IDs; if set, the exon and transcript counts of each gene are
+#	    loaded into exonCount/transcriptCount (see gtfreader.py)
+#	 4. BIOTYPE_RESOLUTION_FILE (optional) - the full mode reads the
+#	    biotype translation from this file (see biotyperesolution.py)
+#	    instead of MRK_BiotypeMapping
+#	 5. SEQGENEMODELLOAD_MODE
+#	    full     - resolve the gene models here and stream the rows into
+#	               SEQ_GeneModel with COPY, in the same transaction as the
+#	               delete of the provider's rows
+#	    setbased - copy columns 1, 7 of the input into a temp table, then
+#	               delete/reload the provider's SEQ_GeneModel rows with a
+#	               single join in the database (no bcp file)
+#	    delta    - resolve as in setbased, then apply only the inserts,
+#	               updates and deletes that differ from SEQ_GeneModel
 #
 # Inputs: 
 #	1. mgd database to resolve gmId to sequence key and translate raw biotype to _MarkerType_key 
 #   2. input file from GM_FILE_DEFAULT, which maps gmId to raw biotype (column 1,7)
 #   this is the same file as is used by the assemblyseqload
+#   (a provider GTF or NCBI gene_info file is also accepted; see biotypereader.py)
+#   (one per provider with -m)
+#   3. optional provider GTF/GFF file (GM_GTF_FILE)
 #
 # Outputs:
-#	 1. SEQ_GeneModel bcp file, tab-delimited
+#	 1. SEQ_GeneModel rows for the provider
 #       1. _Sequence_key
 #	    2. _GMMarkerType_key
 #	    3. raw biotype 
-#	    4. exonCount (null)
-#	    5. transcriptCount (null)
+#	    4. exonCount (null unless GM_GTF_FILE)
+#	    5. transcriptCount (null unless GM_GTF_FILE)
 #	    6. _CreatedBy_key
 #	    7. _ModifiedBy_key
 #	    8. creation_date
 #	    9. modification_date
 #
-# 	 2. Log file
+# 	 2. Log file; the counts are reported separately for each provider
 #
 # Exit Codes:
 #
@@ -53,10 +80,13 @@ Usage='createSeqGeneModelInput.py inputFile (GM_FILE_DEFAULT)'
 
 import sys
 import os
+import time
+import multiprocessing
 import mgi_utils
-import db
-
-db.setTrace()
+import genemodeldb
+import gtfreader
+import biotypereader
+import biotyperesolution
 
 #
 # CONSTANTS 
@@ -66,35 +96,67 @@ CRT = '\n'
 SPACE = ' '
 SCOLON = ';'
 
-# MGI_User key for the load
-CREATEDBY_KEY = os.environ['USERKEY']
+# load mode (full | setbased | delta)
+loadMode = os.getenv('SEQGENEMODELLOAD_MODE', 'full')
+
+# delete of the provider's SEQ_GeneModel rows
+DELETE_SQL = '''
+        delete from SEQ_GeneModel s
+        using ACC_Accession a
+        where a._Object_key = s._Sequence_key
+        and a._MGIType_key = 19
+        and a._LogicalDB_key = %s
+        and a.preferred = 1
+        '''
+
+# server-side resolution of the provider's gene model sequences to the
+# raw biotype from gm_input and its marker type; one row per sequence
+RESOLVE_SQL = '''
+        input as (
+            select distinct on (gmID) gmID, rawBiotype, exonCount, transcriptCount
+            from gm_input
+            order by gmID, lineNum desc
+        ),
+        translation as (
+            select distinct on (t.term) t.term, m._Marker_Type_key
+            from MRK_BiotypeMapping m, VOC_Term t
+            where m._biotypeterm_key = t._Term_key
+            order by t.term, m._Marker_Type_key
+        ),
+        gm as (
+            select a._Object_key as _Sequence_key, i.gmID, i.rawBiotype,
+                i.exonCount, i.transcriptCount, tr._Marker_Type_key
+            from ACC_Accession a
+            left outer join input i on i.gmID = a.accID
+            left outer join translation tr on tr.term = i.rawBiotype
+            where a._MGIType_key = 19
+            and a._LogicalDB_key = %s
+            and a.preferred = 1
+        )'''
 
 #
 # GLOBALS
 #
 
-# bcp file path
-bcpFilePath = ''
-
-# file descriptors
-inFile = ''
-bcpFile = ''
+# providers to load, in order; one dictionary per provider:
+# {'provider', 'inputFile', 'ldbName', 'userKey', 'gtfFile',
+#  'geneIdPattern', 'transcriptIdPattern', 'ldbKey'}
+providers = []
 
 # timestamp for creation/modification date
 cdate = mgi_utils.date('%m/%d/%Y')      # current date
 
 #
-# lookups
+# lookups; loaded once, before the worker processes are started, so the
+# workers share them
 #
-# loaded from provider input file - maps gene model ID to raw biotype
-rawBioTypeByGMIDLookup = {}     # {gmId:rawBioType, ...}
-
 # loaded from db translation query - maps raw biotype to _MarkerType_key
 markerTypeKeyByRawBioTypeLookup = {} # {rawBioType:_MarkerType_key}
 
-# loaded from db by provider - maps a gmId to its _Sequence_key(s) i
+# loaded from db for all providers - maps a provider's logical DB key to
+# its gmId to _Sequence_key(s) lookup
 # Only NCBI has multiple sequences per gmID
-seqKeyByGMIDLookup = {} # {gmId:list of seqKeys, ...}
+seqKeyByGMIDLookupByLdb = {} # {ldbKey:{gmId:list of seqKeys, ...}, ...}
 
 # Purpose:  Load biotype translation Lookup; Lookup raw biotype to get MGI Marker Type Key
 # Returns: nothing
@@ -107,43 +169,59 @@ def loadMarkerTypeKeyLookup():
 
     print("loadMarkerTypeKeyLookup()")
 
-    # load the biotype translation into a lookup
-    results = db.sql('''
-        select distinct t.term, m._Marker_Type_key from MRK_BiotypeMapping m, VOC_Term t where m._biotypeterm_key = t._Term_key
+    # the biotype resolution file written by biotypemapping.py, if there
+    # is one; otherwise query MRK_BiotypeMapping
+    resolutionFile = os.getenv('BIOTYPE_RESOLUTION_FILE', '')
+    if resolutionFile and os.path.exists(resolutionFile):
+        try:
+            resolution = biotyperesolution.Resolution(resolutionFile)
+            markerTypeKeyByRawBioTypeLookup = resolution.markerTypeKeys()
+            resolution.close()
+            print('%s raw biotypes read from %s' % (len(markerTypeKeyByRawBioTypeLookup), resolutionFile))
+            return
+        except (biotyperesolution.Error, IOError) as e:
+            print('%s: reading MRK_BiotypeMapping instead' % (e))
+
+    # load the biotype translation into a lookup; a raw biotype that maps
+    # to more than one marker type gets the lowest _Marker_Type_key, as it
+    # does in the resolution file and the set-based translation
+    results = genemodeldb.sql('''
+        select t.term, min(m._Marker_Type_key) as _Marker_Type_key
+        from MRK_BiotypeMapping m, VOC_Term t
+        where m._biotypeterm_key = t._Term_key
+        group by t.term
         ''', 'auto')
     for r in results:
         markerTypeKeyByRawBioTypeLookup[r['term']] = r['_Marker_Type_key']
     #print(markerTypeKeyByRawBioTypeLookup_
 
-# Purpose:  Load sequence key lookup by seqId for a given provider
+# Purpose:  Load sequence key lookup by seqId for all of the providers,
+#           with one query
 # Returns: nothing
 # Assumes: there is a connection to the database
 # Effects: nothing
 # Throws: nothing
 
 def loadSequenceKeyLookup():
-    global seqKeyByGMIDLookup
+    global seqKeyByGMIDLookupByLdb
 
-    print('loadSequenceKeyLookup() : ' + os.environ['PROVIDER_LOGICALDB'])
+    print('loadSequenceKeyLookup() : ' + ', '.join([p['ldbName'] for p in providers]))
 
-    ldbName =  os.environ['PROVIDER_LOGICALDB']
-    results = db.sql('''select _LogicalDB_key from ACC_LogicalDB where name = '%s' ''' % ldbName, 'auto')
-    if len(results) == 0:
-        print('LogicalDB name not in database: %s' % ldbName)
-        sys.exit(1)
-    ldbKey = results[0]['_LogicalDB_key']
-    results = db.sql('''
-        select accId, _Object_key as seqKey
+    for p in providers:
+        seqKeyByGMIDLookupByLdb[p['ldbKey']] = {}
+
+    results = genemodeldb.sql('''
+        select _LogicalDB_key, accId, _Object_key as seqKey
         from ACC_Accession
         where _MGIType_key = 19
-        and _LogicalDB_key = %s
+        and _LogicalDB_key in (%s)
         and preferred = 1
-        ''' % ldbKey, 'auto')
+        ''' % ', '.join([str(p['ldbKey']) for p in providers]), 'auto')
     for r in results:
+        seqKeyByGMIDLookup = seqKeyByGMIDLookupByLdb[r['_LogicalDB_key']]
         if r['accId'] not in seqKeyByGMIDLookup:
             seqKeyByGMIDLookup[r['accId']] = []
         seqKeyByGMIDLookup[r['accId']].append(r['seqKey'])
-    #print(seqKeyByGMIDLookup)
 
 # Purpose: Initialize globals; load lookups 
 # Returns: nothing
@@ -152,42 +230,34 @@ def loadSequenceKeyLookup():
 # Throws: nothing
 
 def init():
-    global inFile, bcpFilePath, bcpFile
 
     print('%s' % mgi_utils.date())
     print('Initializing')
 
-    if len(sys.argv) != 2:
-        print(Usage)
-        sys.exit(1)
-
-    try:
-        bcpFilePath = os.environ['BCP_FILE_PATH']
-        bcpFile = open(bcpFilePath, 'w')
-    except:
-        print('Could not open file for writing %s\n') % bcpFilePath 
-        sys.exit(1)
-
-    inFile = open(sys.argv[1], 'r')
-    for line in inFile.readlines():
-        columnList = str.split(line[:-1], TAB)
-        gmId = columnList[0]
-        biotype = columnList[6]
-        rawBioTypeByGMIDLookup[gmId] = biotype
-    inFile.close()
-
     loadSequenceKeyLookup()
     loadMarkerTypeKeyLookup()
 
-# Purpose: create the bcp file
-# Returns: nothing
-# Assumes: nothing
-# Effects: creates file in the filesystem
+# Purpose: resolve each of a provider's gene model sequences to its
+#          SEQ_GeneModel row; run in a worker process
+# Returns: dictionary of the provider's rows, counts and log messages
+# Assumes: the lookups have been loaded
+# Effects: nothing
 # Throws: nothing
 
-def run ():
+def resolveRows (p):
+
+    rows = []
+    messages = []
+
+    # loaded from provider input file - maps gene model ID to raw biotype;
+    # as before, the last biotype read for an ID is kept
+    rawBioTypeByGMIDLookup, conflicts = biotypereader.loadBiotypes(p['inputFile'], keepLast = True)
+    for gmId, biotype, otherBiotype in conflicts:
+        messages.append('Differing biotypes for %s: %s and %s' % (gmId, biotype, otherBiotype))
 
-    print('Creating bcp file')
+    # loaded from the provider GTF/GFF, if any - maps gene model ID to
+    # its exon and transcript counts
+    countsByGMIDLookup = readCounts(p, messages)
 
     # current count of gm IDs found in database, but not in input
     notInInputCtr = 0
@@ -196,6 +266,7 @@ def run ():
     # but input raw biotype will not translate
     noTranslationCtr = 0
 
+    seqKeyByGMIDLookup = seqKeyByGMIDLookupByLdb[p['ldbKey']]
     for gmId in list(seqKeyByGMIDLookup.keys()):
 
         seqKeyList = seqKeyByGMIDLookup[gmId]
@@ -203,28 +274,341 @@ def run ():
             if gmId in rawBioTypeByGMIDLookup:
                 rawBioType = rawBioTypeByGMIDLookup[gmId]
             else:
-                print('%s is not in the input file' % gmId)
+                messages.append('%s is not in the input file' % gmId)
                 notInInputCtr = notInInputCtr + 1
                 continue
 
             if rawBioType in markerTypeKeyByRawBioTypeLookup:
                 markerTypeKey = markerTypeKeyByRawBioTypeLookup[rawBioType]
             else:
-                print('GM ID %s raw biotype %s has no translation in the database' % (gmId, rawBioType))
+                messages.append('GM ID %s raw biotype %s has no translation in the database' % (gmId, rawBioType))
                 noTranslationCtr = noTranslationCtr + 1
                 continue
 
-            bcpFile.write('%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s%s' % \
-                (seqKey, TAB, markerTypeKey, TAB, rawBioType, TAB, \
-                    TAB, TAB, CREATEDBY_KEY, TAB, CREATEDBY_KEY, TAB, cdate, TAB, cdate, CRT) )
+            exonCount, transcriptCount = countsByGMIDLookup.get(gmId, (None, None))
+            rows.append((seqKey, markerTypeKey, rawBioType, exonCount, transcriptCount, \
+                p['userKey'], p['userKey'], cdate, cdate))
+
+    return {'rows' : rows, 'messages' : messages,
+        'notInInputCtr' : notInInputCtr, 'noTranslationCtr' : noTranslationCtr}
+
+# Purpose: build every provider's rows in parallel worker processes, then
+#          replace each provider's SEQ_GeneModel rows; for each provider
+#          the delete and the load are one transaction
+# Returns: nothing
+# Assumes: nothing
+# Effects: deletes/inserts SEQ_GeneModel rows
+# Throws: nothing
+
+def run ():
+
+    if len(providers) == 1:
+        results = [resolveRows(providers[0])]
+    else:
+        # fork, so the workers inherit the lookups instead of having them
+        # pickled; the workers do not use the database connection
+        pool = multiprocessing.get_context('fork').Pool(len(providers))
+        try:
+            results = pool.map(resolveRows, providers)
+        finally:
+            pool.close()
+            pool.join()
+
+    for p, r in zip(providers, results):
+
+        print('\nLoading SEQ_GeneModel for %s' % (p['ldbName']))
+        for message in r['messages']:
+            print(message)
+
+        try:
+            genemodeldb.bulkLoad('SEQ_GeneModel', r['rows'], deleteCmd = DELETE_SQL % (p['ldbKey']))
+        except Exception as e:
+            print('SEQ_GeneModel load failed for %s: %s' % (p['ldbName'], e))
+            sys.exit(1)
+        finally:
+            printCounts(r)
+
+    genemodeldb.close()
+
+# Purpose: Read the providers to load from the -m manifest, or from the
+#          command line and environment for a single provider, and look
+#          up their logical DB keys
+# Returns: nothing
+# Assumes: nothing
+# Effects: sets the providers global
+# Throws: nothing
+
+def initProviders():
+
+    if len(sys.argv) == 3 and sys.argv[1] == '-m':
+        fp = open(sys.argv[2], 'r')
+        for line in fp:
+            columnList = str.split(line[:-1], TAB)
+            providers.append({'provider' : columnList[0],
+                'inputFile' : columnList[1],
+                'ldbName' : columnList[2],
+                'userKey' : columnList[3],
+                'gtfFile' : columnList[4],
+                'geneIdPattern' : columnList[5],
+                'transcriptIdPattern' : columnList[6]})
+        fp.close()
+    elif len(sys.argv) == 2:
+        providers.append({'provider' : os.environ['PROVIDER_LOGICALDB'],
+            'inputFile' : sys.argv[1],
+            'ldbName' : os.environ['PROVIDER_LOGICALDB'],
+            'userKey' : os.environ['USERKEY'],
+            'gtfFile' : os.getenv('GM_GTF_FILE', ''),
+            'geneIdPattern' : os.getenv('GM_GTF_GENE_PATTERN', ''),
+            'transcriptIdPattern' : os.getenv('GM_GTF_TRANSCRIPT_PATTERN', '')})
+
+    if len(providers) == 0:
+        print(Usage)
+        sys.exit(1)
+
+    results = genemodeldb.sql('''select _LogicalDB_key, name from ACC_LogicalDB where name in (%s)''' % \
+        ', '.join(["'%s'" % p['ldbName'] for p in providers]), 'auto')
+    ldbKeyByName = {}
+    for r in results:
+        ldbKeyByName[r['name']] = r['_LogicalDB_key']
+
+    for p in providers:
+        if p['ldbName'] not in ldbKeyByName:
+            print('LogicalDB name not in database: %s' % p['ldbName'])
+            sys.exit(1)
+        p['ldbKey'] = ldbKeyByName[p['ldbName']]
+
+# Purpose: Count the exons and transcripts of each gene in the provider
+#          GTF/GFF file, if the provider has one
+# Returns: dictionary {gmId:(exonCount, transcriptCount), ...}
+# Assumes: nothing
+# Effects: adds the number of genes counted to messages
+# Throws: nothing
+
+def readCounts(p, messages):
+
+    if not p['gtfFile']:
+        return {}
+
+    startTime = time.time()
+    countsByGMIDLookup = gtfreader.countExons(p['gtfFile'],
+        p['geneIdPattern'], p['transcriptIdPattern'])
+    messages.append('%s exon/transcript counts for %s genes in %.2f seconds' % \
+        (p['gtfFile'], len(countsByGMIDLookup), time.time() - startTime))
+    return countsByGMIDLookup
+
+# Purpose: Copy the gene model ID and raw biotype from the input file into
+#          the gm_input temp table, with the exon/transcript counts
+# Returns: nothing
+# Assumes: nothing
+# Effects: creates the gm_input temp table
+# Throws: nothing
+
+def copyInputFile(p):
+
+    # only the gene model ID and raw biotype are sent to the server;
+    # lineNum keeps the last biotype for an ID, as the lookup did
+    genemodeldb.sql('drop table if exists gm_input', None)
+    genemodeldb.sql('''
+        create temporary table gm_input (
+            gmID text not null,
+            rawBiotype text,
+            exonCount int,
+            transcriptCount int,
+            lineNum bigserial
+            )
+        ''', None)
+
+    messages = []
+    countsByGMIDLookup = readCounts(p, messages)
+    for message in messages:
+        print(message)
+
+    rows = genemodeldb.copyRows('gm_input',
+        ((gmId, rawBioType) + countsByGMIDLookup.get(gmId, (None, None))
+            for gmId, rawBioType in biotypereader.readBiotypes(p['inputFile'])),
+        ['gmID', 'rawBiotype', 'exonCount', 'transcriptCount'])
+    print('%s gene model Ids copied from the input file' % (rows))
+    genemodeldb.sql('analyze gm_input', None)
+
+# Purpose: Print the unresolved gene model counts
+# Returns: nothing
+# Assumes: nothing
+# Effects: nothing
+# Throws: nothing
+
+def printCounts(r):
+
+    print('\n%s gene model Ids in the database but not in the input file' % (r['notInInputCtr']))
+    print('\n%s gene model Ids not loaded because unable to translate biotype\n' % (r['noTranslationCtr']))
+
+# Purpose: set-based load; resolve the gene models to SEQ_GeneModel rows
+#          in the database with a single join and replace the provider's
+#          rows in one transaction
+# Returns: nothing
+# Assumes: nothing
+# Effects: deletes/inserts SEQ_GeneModel rows
+# Throws: nothing
+
+def runSetBased(p):
+
+    print('%s' % mgi_utils.date())
+    print('Running set-based load for %s' % (p['ldbName']))
+
+    ldbKey = p['ldbKey']
+    copyInputFile(p)
+
+    print('Deleting the existing records for %s' % (p['ldbName']))
+    genemodeldb.sql(DELETE_SQL % (ldbKey), None)
+
+    # the "not in input" and "no translation" counts come from the same
+    # statement that adds the rows
+    print('Adding records for %s' % (p['ldbName']))
+    results = genemodeldb.sql('''
+        with %s,
+        added as (
+            insert into SEQ_GeneModel (_Sequence_key, _GMMarkerType_key, rawBiotype,
+                exonCount, transcriptCount, _CreatedBy_key, _ModifiedBy_key,
+                creation_date, modification_date)
+            select _Sequence_key, _Marker_Type_key, rawBiotype, exonCount, transcriptCount, %s, %s,
+                current_date, current_date
+            from gm
+            where _Marker_Type_key is not null
+            returning 1
+        )
+        select (select count(*) from added) as addedCtr,
+            count(*) filter (where gmID is null) as notInInputCtr,
+            count(*) filter (where gmID is not null and _Marker_Type_key is null) as noTranslationCtr
+        from gm
+        ''' % (RESOLVE_SQL % (ldbKey), p['userKey'], p['userKey']), 'auto')
+
+    r = results[0]
+    printCounts(r)
+    print('%s SEQ_GeneModel records added' % (r['addedCtr']))
+
+    if r['addedCtr'] == 0:
+        print('No SEQ_GeneModel records to add')
+        genemodeldb.rollback()
+        sys.exit(1)
+
+    genemodeldb.commit()
+
+# Purpose: delta load; resolve the gene models in the database, then apply
+#          only the inserts, updates and deletes needed to bring the
+#          provider's SEQ_GeneModel rows up to date, in one transaction
+# Returns: nothing
+# Assumes: nothing
+# Effects: deletes/updates/inserts SEQ_GeneModel rows
+# Throws: nothing
+
+def runDelta(p):
+
+    print('%s' % mgi_utils.date())
+    print('Running delta load for %s' % (p['ldbName']))
+
+    ldbKey = p['ldbKey']
+    copyInputFile(p)
+
+    genemodeldb.sql('drop table if exists gm_new', None)
+    genemodeldb.sql('''
+        create temporary table gm_new as
+        with %s
+        select _Sequence_key, gmID, rawBiotype, exonCount, transcriptCount, _Marker_Type_key
+        from gm
+        ''' % (RESOLVE_SQL % (ldbKey)), None)
+    genemodeldb.sql('create index gm_new_idx1 on gm_new(_Sequence_key)', None)
+    genemodeldb.sql('analyze gm_new', None)
+
+    results = genemodeldb.sql('''
+        select count(*) filter (where gmID is null) as notInInputCtr,
+            count(*) filter (where gmID is not null and _Marker_Type_key is null) as noTranslationCtr,
+            count(*) filter (where _Marker_Type_key is not null) as newCtr
+        from gm_new
+        ''', 'auto')
+    r = results[0]
+    printCounts(r)
+
+    if r['newCtr'] == 0:
+        print('No SEQ_GeneModel records to load')
+        genemodeldb.rollback()
+        sys.exit(1)
 
-    print('\n%s gene model Ids in the database but not in the input file' % (notInInputCtr))
-    print('\n%s gene model Ids not loaded because unable to translate biotype\n' % (noTranslationCtr))
-    bcpFile.close()
+    # rows of the provider that no longer resolve to a marker type
+    results = genemodeldb.sql('''
+        with deleted as (
+            delete from SEQ_GeneModel s
+            using ACC_Accession a
+            where a._Object_key = s._Sequence_key
+            and a._MGIType_key = 19
+            and a._LogicalDB_key = %s
+            and a.preferred = 1
+            and not exists (select 1 from gm_new n
+                where n._Sequence_key = s._Sequence_key
+                and n._Marker_Type_key is not null)
+            returning 1
+        )
+        select count(*) as ctr from deleted
+        ''' % (ldbKey), 'auto')
+    deleteCtr = results[0]['ctr']
+
+    # rows whose marker type, raw biotype or counts changed
+    results = genemodeldb.sql('''
+        with updated as (
+            update SEQ_GeneModel s
+            set _GMMarkerType_key = n._Marker_Type_key,
+                rawBiotype = n.rawBiotype,
+                exonCount = n.exonCount,
+                transcriptCount = n.transcriptCount,
+                _ModifiedBy_key = %s,
+                modification_date = current_date
+            from gm_new n
+            where n._Sequence_key = s._Sequence_key
+            and n._Marker_Type_key is not null
+            and (s._GMMarkerType_key, s.rawBiotype, s.exonCount, s.transcriptCount)
+                is distinct from (n._Marker_Type_key, n.rawBiotype, n.exonCount, n.transcriptCount)
+            returning 1
+        )
+        select count(*) as ctr from updated
+        ''' % (p['userKey']), 'auto')
+    updateCtr = results[0]['ctr']
+
+    # rows that are new for the provider
+    results = genemodeldb.sql('''
+        with inserted as (
+            insert into SEQ_GeneModel (_Sequence_key, _GMMarkerType_key, rawBiotype,
+                exonCount, transcriptCount, _CreatedBy_key, _ModifiedBy_key,
+                creation_date, modification_date)
+            select n._Sequence_key, n._Marker_Type_key, n.rawBiotype, n.exonCount, n.transcriptCount, %s, %s,
+                current_date, current_date
+            from gm_new n
+            where n._Marker_Type_key is not null
+            and not exists (select 1 from SEQ_GeneModel s
+                where s._Sequence_key = n._Sequence_key)
+            returning 1
+        )
+        select count(*) as ctr from inserted
+        ''' % (p['userKey'], p['userKey']), 'auto')
+    insertCtr = results[0]['ctr']
+
+    genemodeldb.commit()
+
+    print('%s SEQ_GeneModel records inserted' % (insertCtr))
+    print('%s SEQ_GeneModel records updated' % (updateCtr))
+    print('%s SEQ_GeneModel records deleted' % (deleteCtr))
 
 #
 # Main
 #
 
-init()
-run()
+initProviders()
+
+if loadMode == 'setbased':
+    for p in providers:
+        runSetBased(p)
+    genemodeldb.close()
+elif loadMode == 'delta':
+    for p in providers:
+        runDelta(p)
+    genemodeldb.close()
+else:
+    init()
+    run()
@@ -9,25 +9,34 @@
 #
 #  Usage:
 #
-#      seqgenemodelload.sh <ensembl | ncbi | ensemblreg | vistareg>
+#      seqgenemodelload.sh <ensembl | ncbi | ensemblreg | vistareg> ...
+#
+#      More than one provider may be given; they are loaded by one run of
+#      seqgenemodelload.py, which loads the shared lookups once.
 #
 #
 #  Env Vars:
 #
 #	GM_FILE_DEFAULT
 #	SEQGENEMODELLOAD_LOGFILE
-#	BCP_FILE_PATH
 #	PROVIDER_LOGICALDB
+#	SEQGENEMODELLOAD_MODE
+#	SEQGENEMODELLOAD_MULTI_LOGFILE
+#	GM_GTF_FILE (optional)
+#	GM_GTF_GENE_PATTERN
+#	GM_GTF_TRANSCRIPT_PATTERN
 #	MGD_DBPASSWORDFILE
 #	MGD_DBNAME
 #	MGD_DBSERVER
 #	MGD_DBUSER
 #
-#  Inputs: ${GM_FILE_DEFAULT}
+#  Inputs: ${GM_FILE_DEFAULT} of each provider
 #
 #  Outputs:
-#       - SEQ_GeneModel bcp file
-#       - Log file (${SEQGENEMODELLOAD_LOGFILE})
+#       - SEQ_GeneModel rows for the provider(s)
+#       - Provider manifest (${OUTPUTDIR}/seqgenemodelload.providers)
+#       - Log file (${SEQGENEMODELLOAD_LOGFILE} for one provider,
+#         ${SEQGENEMODELLOAD_MULTI_LOGFILE} for several)
 #
 #  Exit Codes:
 #
@@ -40,11 +49,12 @@
 #
 #      This script will perform following steps:
 #
-#      1) Determine the provider based upon $1 config file and source it.
-#      2) Call the python script (seqgenemodelload.py) to create a bcp file
-#	  for SEQ_GeneModel
-#      3) Delete SEQ_GeneModel data for provider
-#      4) Load the bcp file into the SEQ_GeneModel  table
+#      1) Determine the config file of each provider, source it (in a
+#	  subshell) and write the provider's input file, logical DB and
+#	  user key to the provider manifest.
+#      2) Call the python script (seqgenemodelload.py) to delete/reload
+#	  the SEQ_GeneModel data of the providers in the manifest; each
+#	  provider is one transaction (see SEQGENEMODELLOAD_MODE).
 #
 #  Notes:  None
 #
@@ -63,33 +73,14 @@ cd `dirname $0`
 
 COMMON_CONFIG=genemodel_common.config
 
-USAGE="Usage: seqgenemodelload.sh <ensembl | ncbi | ensemblreg | vistareg>"
+USAGE="Usage: seqgenemodelload.sh <ensembl | ncbi | ensemblreg | vistareg> ..."
 
 #
-# Make sure a valid provider name was passed as an argument and determine
-# which configuration file to use.
+# Make sure at least one provider name was passed as an argument.
 #
 if [ $# -lt 1 ]
 then
     echo ${USAGE}; exit 1
-elif [ "`echo $1 | grep -i '^ensembl$'`" != "" ]
-then
-    PROVIDER=ensembl
-    CONFIG=genemodel_ensembl.config
-elif [ "`echo $1 | grep -i '^ncbi$'`" != "" ]
-then
-    PROVIDER=ncbi
-    CONFIG=genemodel_ncbi.config
-elif [ "`echo $1 | grep -i '^ensemblreg$'`" != "" ]
-then
-    PROVIDER=ensemblreg
-    CONFIG=genemodel_ensemblreg.config
-elif [ "`echo $1 | grep -i '^vistareg$'`" != "" ]
-then
-    PROVIDER=vistareg
-    CONFIG=genemodel_vistareg.config
-else
-    echo ${USAGE}; exit 1
 fi
 
 #
@@ -104,92 +95,103 @@ else
 fi
 
 #
-# Make sure the provider-specific configuration file exists and source it.
-#
-if [ -f ../${CONFIG} ]
+# Make sure a valid provider name was passed for each argument and
+# determine which configuration file to use.
+#
+CONFIGS=""
+for ARG in $*
+do
+    if [ "`echo ${ARG} | grep -i '^ensembl$'`" != "" ]
+    then
+        CONFIG=genemodel_ensembl.config
+    elif [ "`echo ${ARG} | grep -i '^ncbi$'`" != "" ]
+    then
+        CONFIG=genemodel_ncbi.config
+    elif [ "`echo ${ARG} | grep -i '^ensemblreg$'`" != "" ]
+    then
+        CONFIG=genemodel_ensemblreg.config
+    elif [ "`echo ${ARG} | grep -i '^vistareg$'`" != "" ]
+    then
+        CONFIG=genemodel_vistareg.config
+    else
+        echo ${USAGE}; exit 1
+    fi
+
+    #
+    # Make sure the provider-specific configuration file exists.
+    #
+    if [ ! -f ../${CONFIG} ]
+    then
+        echo "Missing configuration file: ${CONFIG}"
+        exit 1
+    fi
+    CONFIGS="${CONFIGS} ${CONFIG}"
+done
+
+#
+# Initialize the log file; a single provider keeps its own log file.
+#
+if [ $# -eq 1 ]
 then
     . ../${CONFIG}
+    LOG=${SEQGENEMODELLOAD_LOGFILE}
 else
-    echo "Missing configuration file: ${CONFIG}"
-    exit 1
+    LOG=${SEQGENEMODELLOAD_MULTI_LOGFILE}
 fi
-
-#
-# Initialize the log file.
-#
-LOG=${SEQGENEMODELLOAD_LOGFILE}
 rm -rf ${LOG}
 touch ${LOG}
 
 date >> ${LOG}
 
 #
-# Make sure the input file exists
+# Write the provider manifest. Each provider configuration file is sourced
+# in a subshell, so the providers' settings do not mix.
 #
-if [ ! -f ${GM_FILE_DEFAULT} ]
-then
-    echo "Input file does not exist: ${GM_FILE_DEFAULT}" | tee -a ${LOG}
-    exit 1
-fi
+MANIFEST=${OUTPUTDIR}/seqgenemodelload.providers
+rm -f ${MANIFEST}
+for CONFIG in ${CONFIGS}
+do
+    (
+    . ../${CONFIG}
 
-echo "Creating bcp file" | tee -a  ${LOG}
-echo ${GM_FILE_DEFAULT}, ${PROVIDER}, ${CONFIG} | tee -a ${LOG}
-${PYTHON} ./seqgenemodelload.py ${GM_FILE_DEFAULT} >> ${LOG} 2>&1
+    #
+    # Make sure the input file exists
+    #
+    if [ ! -f ${GM_FILE_DEFAULT} ]
+    then
+        echo "Input file does not exist: ${GM_FILE_DEFAULT}" | tee -a ${LOG}
+        exit 1
+    fi
+
+    #
+    # Make sure the GTF file, if any, exists
+    #
+    if [ "${GM_GTF_FILE}" != "" -a ! -f "${GM_GTF_FILE}" ]
+    then
+        echo "GTF file does not exist: ${GM_GTF_FILE}" | tee -a ${LOG}
+        exit 1
+    fi
+
+    echo ${GM_FILE_DEFAULT}, ${GM_PROVIDER}, ${CONFIG} | tee -a ${LOG}
+    printf "%s\t%s\t%s\t%s\t%s\t%s\t%s\n" "${GM_PROVIDER}" "${GM_FILE_DEFAULT}" \
+        "${PROVIDER_LOGICALDB}" "${USERKEY}" "${GM_GTF_FILE}" \
+        "${GM_GTF_GENE_PATTERN}" "${GM_GTF_TRANSCRIPT_PATTERN}" >> ${MANIFEST}
+    ) || exit 1
+done
+
+#
+# seqgenemodelload.py deletes/reloads SEQ_GeneModel for each provider in a
+# single transaction, so nothing is changed for a provider if it fails.
+#
+echo "Loading SEQ_GeneModel (${SEQGENEMODELLOAD_MODE})" | tee -a  ${LOG}
+${PYTHON} ./seqgenemodelload.py -m ${MANIFEST} >> ${LOG} 2>&1
 STAT=$?
 if [ $STAT -ne 0 ]
 then
-   echo "seqgenemodelload failed" | tee -a ${LOG}
-   QUIT=1
-elif [ ! -s ${BCP_FILE_PATH} ]
-then
-    echo "The bcp file is empty" | tee -a ${LOG}
-    QUIT=1
-else
-    QUIT=0
-fi
-
-#
-# Do not attempt to delete/reload SEQ_GeneModel for the provider 
-# if there was a problem creating the bcp file
-#
-if [ ${QUIT} -eq 1 ]
-then
+    echo "seqgenemodelload failed" | tee -a ${LOG}
     exit 1
 fi
 
-#
-# delete SEQ_GeneModel records for current provider
-#
-echo "" >> ${LOG}
-date >> ${LOG}
-echo "Deleting the existing records for ${PROVIDER}" | tee -a ${LOG}
-cat - <<EOSQL | psql -h${MGD_DBSERVER} -d${MGD_DBNAME} -U${MGD_DBUSER} -e  >> ${LOG}
-
-select _Object_key as _Sequence_key
-into temp tmp_gmKey
-from ACC_Accession a
-join acc_logicaldb ldb on ldb._logicaldb_key = a._logicaldb_key
-where _MGIType_key = 19
-and preferred = 1
-and ldb.name = '${PROVIDER_LOGICALDB}'
-;
-
-delete from SEQ_GeneModel
-using tmp_gmKey t
-where SEQ_GeneModel._Sequence_key = t._Sequence_key
-;
-
-EOSQL
-
-#
-# Load SEQ_GeneModel for current provider
-#
-echo "" >> ${LOG}
-date >> ${LOG}
-echo "Adding records for  ${PROVIDER}" | tee -a ${LOG}
-
-${PG_DBUTILS}/bin/bcpin.csh ${MGD_DBSERVER} ${MGD_DBNAME} SEQ_GeneModel "" ${BCP_FILE_PATH} "\t" "\n" mgd >> ${LOG}
-
 date >> ${LOG}
 
 exit 0